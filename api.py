@@ -1,16 +1,16 @@
 import base64
+import bisect
+import csv
 import itertools
 import json
 import statistics
 import sys
-from collections import namedtuple, Counter
+from concurrent.futures import ThreadPoolExecutor
 import opencv_wrapper as cvh
 import io
 
 import cv2
 import numpy as np
-import pandas as pd
-import pytesseract
 import os
 from dotenv import load_dotenv
 
@@ -18,13 +18,33 @@ from PIL import Image
 
 load_dotenv()
 ON_COMPUTER = os.getenv("ON_COMPUTER")
-if not ON_COMPUTER == "1":
-    pytesseract.pytesseract.tesseract_cmd = "/usr/bin/tesseract"
-import scipy.ndimage as snd
 
-from sanitize import sanitize
+from sanitize import sanitize, is_numerical, clean_whitelisted_numerical_cell
 
 DPI = 300
+LINE_LEVEL = 4
+WORD_LEVEL = 5
+LANGUAGE_MAP = {"Norwegian": "nor", "English": "eng"}
+AUTO_LANGUAGE = "Auto"  # picks one of LANGUAGE_MAP from a sample of the rows
+LANGUAGE_SAMPLE_ROWS = 3
+LANGUAGE_SAMPLE_FRACTION = 0.25  # of the page height, at most
+MIN_RULE_FRACTION = 10  # of the page width or height, for a table rule
+REOCR_THRESHOLD = 60  # cells whose words' mean confidence is below are re-read
+# Tesseract processes a page starts at once; the web app passes its own share
+# of the cores (OCR_WORKERS_PER_JOB in config.py)
+OCR_WORKERS = os.cpu_count() or 1
+CELL_PADDING = 4
+MIN_CELL_HEIGHT = 40  # smaller crops are upscaled before re-reading
+NUMERIC_WHITELIST = "0123456789.,-+%"
+
+
+def load_pytesseract():
+    # imported on first use, it pulls in pandas when that is installed
+    import pytesseract
+
+    if not ON_COMPUTER == "1":
+        pytesseract.pytesseract.tesseract_cmd = "/usr/bin/tesseract"
+    return pytesseract
 
 
 def image_to_base64_json(filepath):
@@ -39,18 +59,205 @@ def image_to_base64_json(filepath):
     return image_json
 
 
-def resize_image(image_as_byte_array):
-    MAX_WIDTH = 600
-    image = cv2.imdecode(image_as_byte_array, cv2.IMREAD_COLOR)
-    height, width, _ = image.shape
-    factor = min(1, float(MAX_WIDTH / width))
+MAX_WIDTH = 600
+OCR_RESOLUTION = os.getenv("OCR_RESOLUTION") or "fixed"  # "fixed" or "adaptive"
+TARGET_TEXT_HEIGHT = 30  # pixels, roughly where Tesseract is most accurate
+MIN_OCR_SCALE = 0.25
+MAX_OCR_SCALE = 4.0
+MAX_OCR_WIDTH = 4000
+MIN_GLYPHS_FOR_ESTIMATE = 10
+PNG_COMPRESSION_LEVEL = 1  # intermediate artifacts, so favour speed over size
+MIN_CONTRAST = 8  # standard deviation of the gray levels
+MIN_INK_RATIO = 0.0005
+MAX_INK_RATIO = 0.5
+MAX_SKEW = 15  # degrees, steeper photos are left alone
+MIN_SKEW = 0.3
+MIN_SKEW_GAIN = 1.03  # the level score has to beat the unrotated one by 3 %
+SKEW_SEARCH_WIDTH = 200  # enough for the 1 degree steps of the coarse search
+SKEW_FINE_SEARCH_WIDTH = 1000  # 0.2 degrees moves the ends of a row by 3 px
+REDUCED_COLOR_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+
+def resize_array(image, max_width=MAX_WIDTH):
+    height, width = image.shape[:2]
+    factor = min(1, float(max_width / width))
     new_size = int(factor * width), int(factor * height)
-    image = cv2.resize(image, new_size, interpolation=cv2.INTER_CUBIC)
-    resized_image_as_byte_array = cv2.imencode(".png", image)[1].tostring()
-    return resized_image_as_byte_array
+    return cv2.resize(image, new_size, interpolation=cv2.INTER_CUBIC)
+
+
+def estimate_text_height(gray):
+    widths, heights = glyph_stats(ink_mask(gray))
+    # letters that touch their neighbours would skew the median upwards
+    heights = heights[widths <= 3 * heights]
+    if len(heights) < MIN_GLYPHS_FOR_ESTIMATE:
+        return None
+    return float(np.median(heights))
+
+
+def adaptive_scale(image):
+    text_height = estimate_text_height(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+    if text_height is None:
+        return None
+    height, width = image.shape[:2]
+    scale = TARGET_TEXT_HEIGHT / text_height
+    scale = min(max(scale, MIN_OCR_SCALE), MAX_OCR_SCALE, MAX_OCR_WIDTH / width)
+    return scale
+
+
+def resize_for_ocr(image, resolution=OCR_RESOLUTION):
+    if resolution == "adaptive":
+        scale = adaptive_scale(image)
+        if scale is not None:
+            height, width = image.shape[:2]
+            new_size = int(scale * width), int(scale * height)
+            interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+            return cv2.resize(image, new_size, interpolation=interpolation)
+    return resize_array(image)
+
+
+def reduced_color_flag(image_contents, min_width):
+    # PIL only parses the header here, so this is cheap. The shorter side is
+    # used because imdecode applies the EXIF orientation and PIL doesn't.
+    width = min(Image.open(io.BytesIO(image_contents)).size)
+    for factor, flag in REDUCED_COLOR_FLAGS:
+        if width // factor >= min_width:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def encode_png_with_dpi(pil_image):
+    with io.BytesIO() as output:
+        pil_image.save(
+            output, format="PNG", dpi=(DPI, DPI), compress_level=PNG_COMPRESSION_LEVEL
+        )  # 300*300 DPI is best for OCR
+        return output.getvalue()
+
+
+class ImageQualityError(ValueError):
+    pass
+
 
+def ink_mask(gray):
+    return cvh.threshold_otsu(gray, inverse=True)  # ink is white
 
-def tesseract_specific_code(image_json):
+
+def glyph_stats(ink):
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    image_height, image_width = ink.shape
+    # ignore specks, and table rules and borders which are long and thin
+    is_glyph = (
+        (heights >= 4) & (heights < image_height / 4) & (widths < image_width / 4)
+    )
+    return widths[is_glyph], heights[is_glyph]
+
+
+def is_sideways(widths, heights):
+    # upright letters and digits are taller than they are wide
+    return float(np.median(widths / heights)) > 1
+
+
+def rotate(image, angle, border_mode=cv2.BORDER_CONSTANT):
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1)
+    return cv2.warpAffine(
+        image, matrix, (width, height), flags=cv2.INTER_LINEAR, borderMode=border_mode
+    )
+
+
+def projection_score(ys, xs, angle):
+    # text lines give sharp peaks in the row profile when they are level
+    theta = np.deg2rad(angle)
+    rows = np.round(ys * np.cos(theta) - xs * np.sin(theta)).astype(np.int64)
+    row_profile = np.bincount(rows - rows.min()).astype(np.float64)
+    return float(np.sum(row_profile**2))
+
+
+def ink_pixels(ink, max_width):
+    factor = min(1, max_width / ink.shape[1])
+    small = cv2.resize(ink, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    return np.nonzero(small > 127)
+
+
+def estimate_skew(ink):
+    ys, xs = ink_pixels(ink, SKEW_SEARCH_WIDTH)
+    if len(ys) == 0:
+        return 0.0
+    coarse = np.arange(-MAX_SKEW, MAX_SKEW + 1, 1.0)
+    best = max(coarse, key=lambda angle: projection_score(ys, xs, angle))
+    # tenths of a degree only show up in the profile of a wider image
+    ys, xs = ink_pixels(ink, SKEW_FINE_SEARCH_WIDTH)
+    fine = np.arange(best - 0.8, best + 0.9, 0.2)
+    scores = {angle: projection_score(ys, xs, angle) for angle in fine}
+    best = max(scores, key=scores.get)
+    if scores[best] < MIN_SKEW_GAIN * projection_score(ys, xs, 0.0):
+        return 0.0  # the profile is about as sharp unrotated, so leave it
+    return float(best)
+
+
+def straighten_image(image):
+    """Deskew image so its text is level, or raise ImageQualityError.
+
+    Runs on the Otsu mask that column detection uses too and takes a few
+    milliseconds, so blank pages and pictures without text are turned away
+    before any OCR. Returns the image and its mask, both straightened.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if gray.std() < MIN_CONTRAST:
+        raise ImageQualityError("The image looks blank.")
+    otsu = cvh.threshold_otsu(gray)
+    ink = cv2.bitwise_not(otsu)  # ink is white
+    ink_ratio = np.count_nonzero(ink) / ink.size
+    if not MIN_INK_RATIO <= ink_ratio <= MAX_INK_RATIO:
+        raise ImageQualityError(
+            "The image doesn't look like dark text on a light background."
+        )
+    widths, heights = glyph_stats(ink)
+    if len(widths) == 0:
+        raise ImageQualityError("Couldn't find any text in the image.")
+    if len(widths) < MIN_GLYPHS_FOR_ESTIMATE:
+        return image, otsu  # too little text to tell its orientation or skew
+    if is_sideways(widths, heights):
+        raise ImageQualityError(
+            "The text runs sideways. Please rotate the image and upload it again."
+        )
+    skew = estimate_skew(ink)
+    if abs(skew) >= MIN_SKEW:
+        image = rotate(image, skew, border_mode=cv2.BORDER_REPLICATE)
+        otsu = rotate(otsu, skew, border_mode=cv2.BORDER_REPLICATE)
+        _, otsu = cv2.threshold(otsu, 127, 255, cv2.THRESH_BINARY)
+    return image, otsu
+
+
+def preprocess_image(image_contents, resolution=OCR_RESOLUTION):
+    # decode once; the working image, the PNG and the thumbnails all share it
+    image_as_byte_array = np.frombuffer(image_contents, np.uint8)
+    # the adaptive scale is only known after decoding, but never goes wider
+    target_width = MAX_OCR_WIDTH if resolution == "adaptive" else MAX_WIDTH
+    try:
+        flag = reduced_color_flag(image_contents, target_width)
+    except OSError:  # PIL couldn't identify it, or it is cut short
+        raise ImageQualityError("The file isn't an image that can be read.")
+    image = cv2.imdecode(image_as_byte_array, flag)
+    if image is None:
+        raise ImageQualityError("The file isn't an image that can be read.")
+    image = resize_for_ocr(image, resolution=resolution)
+    image, otsu = straighten_image(image)
+    pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    return {
+        "image": image,
+        "image_contents": encode_png_with_dpi(pil_image),
+        "otsu": otsu,  # for find_number_of_columns_in_image
+        "pil_image": pil_image,
+    }
+
+
+def tesseract_specific_code(image_json, ocr_workers=OCR_WORKERS):
     base64_encoded_image = image_json.get("base64_image")
     language = image_json.get("language")
     image_string = base64.b64decode(base64_encoded_image)
@@ -65,16 +272,96 @@ def tesseract_specific_code(image_json):
         gray = np.array(image)
     otsu = cvh.threshold_otsu(gray)
 
-    language_map = {"Norwegian": "nor", "English": "eng"}
-    language_config = language_map[language]
+    if language == AUTO_LANGUAGE:
+        language = detect_language(otsu, ocr_workers)
+    language_config = LANGUAGE_MAP[language]
     tesseract_config = (
         f"--psm 6 -l {language_config}"
     )  # assume a single uniform block of text
+    pytesseract = load_pytesseract()
     data = pytesseract.image_to_data(
         otsu, config=tesseract_config, output_type=pytesseract.Output.DICT
     )
     data["shape"] = image.size
-    return json.dumps(data)
+    data["otsu"] = otsu  # kept for re-reading single cells
+    data["language"] = language
+    return data
+
+
+def remove_rules(ink):
+    # table rules and borders are runs of ink much longer than any letter
+    height, width = ink.shape
+    horizontal = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (max(1, width // MIN_RULE_FRACTION), 1)
+    )
+    vertical = cv2.getStructuringElement(
+        cv2.MORPH_RECT, (1, max(1, height // MIN_RULE_FRACTION))
+    )
+    rules = cv2.bitwise_or(
+        cv2.morphologyEx(ink, cv2.MORPH_OPEN, horizontal),
+        cv2.morphologyEx(ink, cv2.MORPH_OPEN, vertical),
+    )
+    return cv2.subtract(ink, rules)
+
+
+def densest_window(ink_per_row, start, end, height):
+    if end - start <= height:
+        return start, end
+    sums = np.convolve(ink_per_row[start:end], np.ones(height), mode="valid")
+    start += int(np.argmax(sums))
+    return start, start + height
+
+
+def densest_text_rows(otsu, n):
+    """Crop of the n text rows with the most ink, stacked on top of each other.
+
+    Rules are left out of the row profile, as they would join the rows they
+    cross into one. However tall the rows are, the crop is no taller than
+    LANGUAGE_SAMPLE_FRACTION of the page, or n * MIN_CELL_HEIGHT on small
+    pages.
+    """
+    text = remove_rules(cv2.bitwise_not(otsu))
+    ink_per_row = np.count_nonzero(text, axis=1)
+    has_ink = ink_per_row > 0
+    changes = np.flatnonzero(np.diff(has_ink.astype(np.int8))) + 1
+    edges = np.concatenate(([0], changes, [len(has_ink)]))
+    bands = [
+        (start, end)
+        for start, end in zip(edges[:-1], edges[1:])
+        if has_ink[start] and end - start > 2
+    ]
+    if len(bands) == 0:
+        bands = [(0, len(has_ink))]
+    bands = sorted(bands, key=lambda band: -ink_per_row[band[0] : band[1]].sum())
+    bands = sorted(bands[:n])  # back in reading order
+    budget = max(int(len(has_ink) * LANGUAGE_SAMPLE_FRACTION), n * MIN_CELL_HEIGHT)
+    # the padding around every row and the gaps between them count too
+    padding = (4 * len(bands) - 2) * CELL_PADDING
+    max_height = max(1, (budget - padding) // len(bands))
+    bands = [
+        densest_window(ink_per_row, start, end, max_height) for start, end in bands
+    ]
+    gap = np.full((CELL_PADDING * 2, otsu.shape[1]), 255, dtype=otsu.dtype)
+    crops = []
+    for start, end in bands:
+        crops += [otsu[max(0, start - CELL_PADDING) : end + CELL_PADDING], gap]
+    return np.vstack(crops[:-1])
+
+
+def sample_confidence(sample, language):
+    result = ocr_cell(sample, f"--psm 6 -l {LANGUAGE_MAP[language]}")
+    return result[1] if result is not None else 0.0
+
+
+def detect_language(otsu, ocr_workers=OCR_WORKERS):
+    # a few rows with each language cost a fraction of reading the page twice
+    sample = densest_text_rows(otsu, LANGUAGE_SAMPLE_ROWS)
+    languages = list(LANGUAGE_MAP)
+    workers = min(len(languages), ocr_workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        samples = [sample] * len(languages)
+        confidences = list(executor.map(sample_confidence, samples, languages))
+    return languages[confidences.index(max(confidences))]
 
 
 def find_index_of_n_largest(items, n):
@@ -117,18 +404,314 @@ def partition(items, predicate=bool):
     return ((item for pred, item in a if not pred), (item for pred, item in b if pred))
 
 
-def analyze(image_json, number_of_columns):
-    data = json.loads(tesseract_specific_code(image_json))
-    height, width = data.pop("shape", None)  # assumes color image
+class Table:
+    """Rows of cell texts, with the word confidences and box of every cell.
+
+    A cell's confidence is the mean of its words' confidences and its box is
+    (left, top, right, bottom) around its words; both are None for empty cells.
+    language is the one the table was read in, which matters for "Auto".
+    layout keeps the column boundaries and the word boxes of every row, so
+    the columns can be moved later without reading the image again.
+    """
+
+    def __init__(
+        self, rows, number_of_columns, confidences, boxes, language=None, layout=None
+    ):
+        self.rows = rows
+        self.number_of_columns = number_of_columns
+        self.confidences = confidences
+        self.boxes = boxes
+        self.language = language
+        self.layout = layout
+
+    def to_json(self):
+        return table_rows_to_json(self.rows)
+
+    def layout_to_json(self):
+        return json.dumps(self.layout) if self.layout is not None else None
+
+    def __repr__(self):
+        return "<Table {}x{}>".format(len(self.rows), self.number_of_columns)
+
+
+def table_rows_to_json(rows):
+    # same layout as pandas' to_json(orient="split"), which older tables used
+    number_of_columns = max((len(row) for row in rows), default=0)
+    return json.dumps(
+        {
+            "columns": list(range(number_of_columns)),
+            "index": list(range(len(rows))),
+            "data": rows,
+        }
+    )
+
+
+def table_rows_from_json(table_json):
+    return json.loads(table_json)["data"]
+
+
+def table_layout(width, dividing_points, line_word_boxes):
+    return {
+        "width": width,
+        "dividing_points": [int(point) for point in dividing_points],
+        "lines": [
+            [[box.left, box.top, box.right, box.bottom, box.text] for box in words]
+            for words in line_word_boxes
+        ],
+    }
+
+
+def column_of_word(right, dividing_points):
+    # a word belongs left of a boundary its right edge doesn't cross
+    return bisect.bisect_left(dividing_points, right)
+
+
+def move_dividing_points(rows, layout, dividing_points):
+    """Move the column boundaries of a table, changing rows and layout in place.
+
+    Only the cells on either side of a boundary that moved are rebuilt, from
+    the stored word boxes, so the others keep their re-OCRed text. Returns the
+    changed cells as (row, column, text).
+    """
+    columns = set()
+    for i, (old, new) in enumerate(zip(layout["dividing_points"], dividing_points)):
+        if old != new:
+            columns.update((i, i + 1))
+    changed = []
+    for i, (row, words) in enumerate(zip(rows, layout["lines"])):
+        cells = {column: [] for column in columns}
+        for left, top, right, bottom, text in sorted(words, key=lambda w: w[2]):
+            column = column_of_word(right, dividing_points)
+            if column in cells:
+                cells[column].append(text)
+        for column, texts in sorted(cells.items()):
+            text = sanitize([" ".join(texts)])[0]
+            if row[column] != text:
+                row[column] = text
+                changed.append((i, column, text))
+    layout["dividing_points"] = list(dividing_points)
+    return changed
+
+
+def cell_confidence(word_boxes):
+    confidences = [float(box.conf) for box in word_boxes if float(box.conf) >= 0]
+    if len(confidences) == 0:
+        return None
+    return sum(confidences) / len(confidences)
+
+
+def cell_box(word_boxes):
+    if len(word_boxes) == 0:
+        return None
+    return (
+        min(box.left for box in word_boxes),
+        min(box.top for box in word_boxes),
+        max(box.right for box in word_boxes),
+        max(box.bottom for box in word_boxes),
+    )
+
+
+def find_numeric_columns(rows):
+    numeric_columns = []
+    for column in zip(*rows):
+        cells = [cell for cell in column if len(cell) > 0]
+        numerical_cells = [cell for cell in cells if is_numerical(cell)]
+        is_numeric = len(cells) > 0 and len(numerical_cells) / len(cells) > 0.5
+        numeric_columns.append(is_numeric)
+    return numeric_columns
+
+
+def cell_tesseract_config(language_config, numeric):
+    tesseract_config = f"--psm 7 -l {language_config}"  # a single line of text
+    if numeric:
+        tesseract_config += f" -c tessedit_char_whitelist={NUMERIC_WHITELIST}"
+    return tesseract_config
+
+
+def crop_cell(otsu, box):
+    left, top, right, bottom = box
+    image_height, image_width = otsu.shape
+    crop = otsu[
+        max(0, top - CELL_PADDING) : min(image_height, bottom + CELL_PADDING),
+        max(0, left - CELL_PADDING) : min(image_width, right + CELL_PADDING),
+    ]
+    crop_height = crop.shape[0]
+    if crop_height < MIN_CELL_HEIGHT:
+        factor = MIN_CELL_HEIGHT / crop_height
+        crop = cv2.resize(
+            crop, None, fx=factor, fy=factor, interpolation=cv2.INTER_CUBIC
+        )
+        crop = cvh.threshold_otsu(crop)
+    return crop
+
+
+def ocr_cell(crop, tesseract_config):
+    pytesseract = load_pytesseract()
+    data = pytesseract.image_to_data(
+        crop, config=tesseract_config, output_type=pytesseract.Output.DICT
+    )
+    words = [
+        (text, float(conf))
+        for text, conf in zip(data["text"], data["conf"])
+        if float(conf) >= 0 and text.strip()
+    ]
+    if len(words) == 0:
+        return None
+    text = " ".join(text for text, _ in words)
+    confidence = sum(conf for _, conf in words) / len(words)
+    return text, confidence
+
+
+def row_spans(table):
+    spans = []
+    for row_boxes in table.boxes:
+        boxes = [box for box in row_boxes if box is not None]
+        if len(boxes) == 0:
+            spans.append(None)
+        else:
+            spans.append((min(box[1] for box in boxes), max(box[3] for box in boxes)))
+    return spans
+
+
+def numerical_rows(table, j):
+    # headers and text above a numeric column keep what the first pass read
+    return [
+        i
+        for i, row in enumerate(table.rows)
+        if len(row[j]) > 0 and is_numerical(row[j]) and table.boxes[i][j] is not None
+    ]
+
+
+def column_strip(otsu, table, j, rows):
+    boxes = [table.boxes[i][j] for i in rows]
+    image_height, image_width = otsu.shape
+    left = max(0, min(box[0] for box in boxes) - CELL_PADDING)
+    top = max(0, min(box[1] for box in boxes) - CELL_PADDING)
+    right = min(image_width, max(box[2] for box in boxes) + CELL_PADDING)
+    bottom = min(image_height, max(box[3] for box in boxes) + CELL_PADDING)
+    return otsu[top:bottom, left:right], (left, top)
+
+
+def ocr_numeric_strip(strip, language_config):
+    tesseract_config = (
+        f"--psm 6 -l {language_config} -c tessedit_char_whitelist={NUMERIC_WHITELIST}"
+    )
+    pytesseract = load_pytesseract()
+    data = pytesseract.image_to_data(
+        strip, config=tesseract_config, output_type=pytesseract.Output.DICT
+    )
+    word_boxes = create_box_objects_from_tesseract_bounding_boxes(
+        data, levels=(WORD_LEVEL,)
+    )
+    return [box for box in word_boxes if box.text.strip() and box.conf >= 0]
+
+
+def assign_words_to_rows(word_boxes, top, spans):
+    words_in_rows = [[] for _ in spans]
+    for box in word_boxes:
+        center = top + (box.top + box.bottom) / 2
+        distances = [
+            abs(center - (span[0] + span[1]) / 2) if span is not None else None
+            for span in spans
+        ]
+        candidates = [(d, i) for i, d in enumerate(distances) if d is not None]
+        if len(candidates) == 0:
+            continue
+        _, i = min(candidates)
+        words_in_rows[i].append(box)
+    return words_in_rows
+
+
+def reocr_numeric_columns(table, otsu, language_config, ocr_workers=OCR_WORKERS):
+    # read numeric columns again as whole strips, restricted to digits
+    numeric_columns = [
+        j for j, numeric in enumerate(find_numeric_columns(table.rows)) if numeric
+    ]
+    if len(numeric_columns) == 0:
+        return table
+    rows_to_read = {j: numerical_rows(table, j) for j in numeric_columns}
+    strips, offsets = zip(
+        *[column_strip(otsu, table, j, rows_to_read[j]) for j in numeric_columns]
+    )
+    with ThreadPoolExecutor(max_workers=ocr_workers) as executor:
+        results = list(
+            executor.map(
+                lambda strip: ocr_numeric_strip(strip, language_config), strips
+            )
+        )
+    spans = row_spans(table)
+    for j, (left, top), word_boxes in zip(numeric_columns, offsets, results):
+        for i, words in enumerate(assign_words_to_rows(word_boxes, top, spans)):
+            if len(words) == 0 or i not in rows_to_read[j]:
+                continue
+            confidence = cell_confidence(words)
+            previous_confidence = table.confidences[i][j]
+            if confidence is None or (
+                previous_confidence is not None and confidence < previous_confidence
+            ):
+                continue
+            words = sorted(words, key=lambda box: box.left)
+            text = " ".join(box.text for box in words)
+            table.rows[i][j] = clean_whitelisted_numerical_cell(text)
+            table.confidences[i][j] = confidence
+            box = cell_box(words)
+            table.boxes[i][j] = (
+                box[0] + left,
+                box[1] + top,
+                box[2] + left,
+                box[3] + top,
+            )
+    return table
+
+
+def reocr_low_confidence_cells(
+    table, otsu, language_config, threshold, ocr_workers=OCR_WORKERS
+):
+    numeric_columns = find_numeric_columns(table.rows)
+    low_confidence_cells = [
+        (i, j)
+        for i, row_confidences in enumerate(table.confidences)
+        for j, confidence in enumerate(row_confidences)
+        if confidence is not None and confidence < threshold
+    ]
+    if len(low_confidence_cells) == 0:
+        return table
+    jobs = [
+        (
+            crop_cell(otsu, table.boxes[i][j]),
+            cell_tesseract_config(language_config, numeric_columns[j]),
+        )
+        for i, j in low_confidence_cells
+    ]
+    # pytesseract runs tesseract in a subprocess, so threads do run in parallel
+    with ThreadPoolExecutor(max_workers=ocr_workers) as executor:
+        results = list(executor.map(lambda job: ocr_cell(*job), jobs))
+    for (i, j), result in zip(low_confidence_cells, results):
+        if result is None:
+            continue
+        text, confidence = result
+        if confidence > table.confidences[i][j]:
+            table.rows[i][j] = sanitize([text])[0]
+            table.confidences[i][j] = confidence
+    return table
+
+
+def analyze(
+    image_json,
+    number_of_columns,
+    reocr_threshold=REOCR_THRESHOLD,
+    numeric_columns=True,
+    ocr_workers=OCR_WORKERS,
+):
+    data = tesseract_specific_code(image_json, ocr_workers)
+    width, height = data.pop("shape", None)  # PIL sizes are (width, height)
+    otsu = data.pop("otsu")
+    language = data.pop("language")
 
     boxes = create_box_objects_from_tesseract_bounding_boxes(data)
 
     should_sanitize = True
 
-    levels = Counter(box.level for box in boxes)
-    LINE_LEVEL = 4
-    WORD_LEVEL = 5
-
     ## SHOULD FIX SOMETHING HERE
 
     boxes_bounding_lines = get_boxes_at_level(boxes, LINE_LEVEL)
@@ -158,6 +741,8 @@ def analyze(image_json, number_of_columns):
         dividing_points = []
     rows_strings = []
     rows = []
+    row_confidences = []
+    row_boxes = []
     sorted_line_dicts = sorted(line_dicts, key=lambda l: l["bounding_box"].top)
     all_distances = []
     for i in range(number_of_columns):
@@ -166,6 +751,7 @@ def analyze(image_json, number_of_columns):
     for j, line_dict in enumerate(sorted_line_dicts):
         boxes_to_left = line_dict["word_boxes"]
         cells = []
+        cell_word_boxes = []
         if number_of_columns > 1:
             left_point = 0
             for i, right_point in enumerate(right_points):
@@ -190,6 +776,7 @@ def analyze(image_json, number_of_columns):
                 all_distances[i].append(distances)
                 text = " ".join(p.text for p in boxes_to_left)
                 cells.append(text)
+                cell_word_boxes.append(boxes_to_left)
                 boxes_to_left = boxes_to_right
                 left_point = right_point
             right_point = width
@@ -202,17 +789,21 @@ def analyze(image_json, number_of_columns):
             distances = (distance_to_left, distance_to_right)
             all_distances[(number_of_columns - 1)].append(distances)
             cells.append(" ".join(p.text for p in boxes_to_left))
+            cell_word_boxes.append(boxes_to_left)
             comma_separated_row = ",".join(cells)
             rows_strings.append(comma_separated_row)
         else:  # 1 column
             cell = " ".join(p.text for p in boxes_to_left)
             cells = [cell]
+            cell_word_boxes = [boxes_to_left]
             rows_strings.append(cell)
         if should_sanitize:
             sanitized_cells = sanitize(cells)
         else:
             sanitized_cells = cells
         rows.append(sanitized_cells)
+        row_confidences.append([cell_confidence(b) for b in cell_word_boxes])
+        row_boxes.append([cell_box(b) for b in cell_word_boxes])
     """
     if number_of_columns > 1:
         alignment_list = find_column_alignments(all_distances)
@@ -220,29 +811,82 @@ def analyze(image_json, number_of_columns):
         alignment_list = ["left"]
     """
 
-    df = pd.DataFrame(rows, columns=None)
-    df_json = df.to_json(orient="split")
-    return {"df": df_json}  # "alignment_list": alignment_list}
-
-
-def create_box_objects_from_tesseract_bounding_boxes(data):
-    fields_string = "level left top width height conf text"
-    fields = fields_string.split()
-    for field, values in data.items():
-        N = len(values)
-    boxes = [{} for _ in range(N)]
-    for field, values in data.items():
-        if field in fields:
-            for i, value in enumerate(values):
-                boxes[i][field] = value
-    for box in boxes:
-        box["right"] = box["left"] + box["width"]
-        box["bottom"] = box["top"] + box["height"]
-        box["size"] = box["width"] * box["height"]
-    example_box = boxes[0]
-    Box = namedtuple("Box", sorted(example_box))
-    boxes = [Box(**box) for box in boxes]
-    return boxes
+    layout = table_layout(
+        width, dividing_points, [l["word_boxes"] for l in sorted_line_dicts]
+    )
+    table = Table(rows, number_of_columns, row_confidences, row_boxes, language, layout)
+    language_config = LANGUAGE_MAP[language]
+    if numeric_columns:
+        table = reocr_numeric_columns(table, otsu, language_config, ocr_workers)
+    if reocr_threshold is not None:
+        table = reocr_low_confidence_cells(
+            table, otsu, language_config, reocr_threshold, ocr_workers
+        )
+    return table
+
+
+class Box:
+    __slots__ = (
+        "level",
+        "left",
+        "top",
+        "width",
+        "height",
+        "right",
+        "bottom",
+        "size",
+        "conf",
+        "text",
+    )
+
+    def __init__(
+        self, level, left, top, width, height, right, bottom, size, conf, text
+    ):
+        self.level = level
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.right = right
+        self.bottom = bottom
+        self.size = size
+        self.conf = conf
+        self.text = text
+
+    def __repr__(self):
+        return "<Box level={} ({}, {}, {}, {}) {!r}>".format(
+            self.level, self.left, self.top, self.right, self.bottom, self.text
+        )
+
+
+def create_box_objects_from_tesseract_bounding_boxes(
+    data, levels=(LINE_LEVEL, WORD_LEVEL)
+):
+    # only the requested levels become objects; everything else stays in arrays
+    level = np.asarray(data["level"], dtype=np.int64)
+    keep = np.flatnonzero(np.isin(level, levels))
+    left = np.asarray(data["left"], dtype=np.int64)[keep]
+    top = np.asarray(data["top"], dtype=np.int64)[keep]
+    width = np.asarray(data["width"], dtype=np.int64)[keep]
+    height = np.asarray(data["height"], dtype=np.int64)[keep]
+    conf = np.asarray(data["conf"], dtype=np.float64)[keep]
+    texts = data["text"]
+    text = [texts[i] for i in keep.tolist()]
+    return [
+        Box(*values)
+        for values in zip(
+            level[keep].tolist(),
+            left.tolist(),
+            top.tolist(),
+            width.tolist(),
+            height.tolist(),
+            (left + width).tolist(),
+            (top + height).tolist(),
+            (width * height).tolist(),
+            conf.tolist(),
+            text,
+        )
+    ]
 
 
 def find_boxes_inside_line(boxes_bounding_words, line_box):
@@ -294,8 +938,27 @@ def find_column_alignments(all_distances):
     return alignment_list
 
 
-def write_to_files(df_json, filepath):
-    df = pd.read_json(df_json, orient="split")
+def table_rows_to_csv(rows):
+    with io.StringIO() as output:
+        csv.writer(output, lineterminator="\n").writerows(rows)
+        return str.encode(output.getvalue())
+
+
+def table_rows_to_excel(rows):
+    import xlsxwriter
+
+    with io.BytesIO() as output:
+        workbook = xlsxwriter.Workbook(
+            output, {"in_memory": True, "strings_to_numbers": True}
+        )
+        worksheet = workbook.add_worksheet()
+        for i, row in enumerate(rows):
+            worksheet.write_row(i, 0, row)
+        workbook.close()
+        return output.getvalue()
+
+
+def write_to_files(table, filepath):
     parent_directory, _, filename_with_ending = filepath.rpartition("/")
     filename_without_ending, _, _ = filename_with_ending.rpartition(".")
     if parent_directory:
@@ -310,21 +973,20 @@ def write_to_files(df_json, filepath):
         csv_path = f"{filename_without_ending}.csv"
         excel_path = f"{filename_without_ending}.xlsx"
     print(f"Writing csv file {csv_path}.")
-    df.to_csv(csv_path, header=None, index=False)
+    with open(csv_path, "wb") as f:
+        f.write(table_rows_to_csv(table.rows))
     print(f"Writing excel file {excel_path}.")
-    df.to_excel(excel_path, header=None, index=False)
+    with open(excel_path, "wb") as f:
+        f.write(table_rows_to_excel(table.rows))
 
 
-def find_number_of_columns(image_json, show=False):
-    base64_encoded_image = image_json.get("base64_image")
-    image_string = base64.b64decode(base64_encoded_image)
-    image_as_byte_array = np.frombuffer(image_string, np.uint8)
-    image = cv2.imdecode(image_as_byte_array, cv2.IMREAD_UNCHANGED)
+def find_number_of_columns_in_image(image, show=False, otsu=None):
     try:
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     except:
         gray = image
-    otsu = cvh.threshold_otsu(gray)
+    if otsu is None:
+        otsu = cvh.threshold_otsu(gray)
     x_axis_sum = np.sum(otsu, axis=0)
     sum_image_height = 50
     sum_image = np.zeros((sum_image_height, *x_axis_sum.shape))
@@ -341,6 +1003,8 @@ def find_number_of_columns(image_json, show=False):
         plt.figure()
         plt.imshow(sum_image)
 
+    import scipy.ndimage as snd
+
     eroded = snd.grey_opening(sum_image, 11)
 
     if show:
@@ -365,5 +1029,5 @@ def find_number_of_columns(image_json, show=False):
     dilated = dilated[first_black:last_black]
     diffed = np.diff(dilated)
     num_changes = np.count_nonzero(diffed)
-    num_columns = (num_changes + 2) // 2
+    num_columns = int(num_changes + 2) // 2
     return num_columns
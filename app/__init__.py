@@ -1,8 +1,11 @@
 import logging
 from logging.handlers import SMTPHandler, RotatingFileHandler
 import os
+import sqlite3
 from flask import Flask, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_mail import Mail
@@ -14,6 +17,36 @@ from flask_uploads import UploadSet, configure_uploads, IMAGES, patch_request_cl
 app = Flask(__name__)
 app.config.from_object(Config)
 db = SQLAlchemy(app)
+
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    # readers no longer block on writers, and writers wait instead of failing
+    cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+    cursor.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT']}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+@event.listens_for(Engine, "connect")
+def remember_connection_pid(dbapi_connection, connection_record):
+    connection_record.info["pid"] = os.getpid()
+
+
+@event.listens_for(Engine, "checkout")
+def check_connection_pid(dbapi_connection, connection_record, connection_proxy):
+    # a connection inherited through a fork (uWSGI workers) belongs to the
+    # parent, so drop it without closing and let the pool open a new one
+    if connection_record.info["pid"] != os.getpid():
+        connection_record.connection = connection_proxy.connection = None
+        raise exc.DisconnectionError(
+            f"Connection belongs to process {connection_record.info['pid']}"
+        )
+
+
 migrate = Migrate(app, db)
 login = LoginManager(app)
 login.login_view = "login"
@@ -70,4 +103,4 @@ if not app.debug:
     app.logger.setLevel(logging.INFO)
     app.logger.info(f"{app_name} startup")
 
-from app import routes, models, errors
+from app import routes, models, errors, json_api
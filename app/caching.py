@@ -0,0 +1,64 @@
+import hashlib
+import os
+import time
+from functools import lru_cache
+from flask import make_response, render_template, request, session
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
+from app import app
+from app.models import Image
+from api import table_rows_from_json
+
+TABLE_FRAGMENT_CACHE_SIZE = 256
+CSRF_TIME_LIMIT = 3600  # Flask-WTF's default
+
+
+def templates_version():
+    # pages rendered from older templates mustn't match after a deploy
+    folder = os.path.join(app.root_path, app.template_folder)
+    return max(
+        os.path.getmtime(os.path.join(folder, name)) for name in os.listdir(folder)
+    )
+
+
+TEMPLATES_VERSION = templates_version()
+
+
+def page_etag(*parts):
+    # the forms' CSRF tokens expire, so a page is reused for half their lifetime
+    time_limit = app.config.get("WTF_CSRF_TIME_LIMIT", CSRF_TIME_LIMIT)
+    period = int(time.time() // ((time_limit or CSRF_TIME_LIMIT) // 2))
+    # and are signed with a secret from the session, which a new session lacks
+    csrf_secret = session.get(app.config.get("WTF_CSRF_FIELD_NAME", "csrf_token"))
+    key = repr((TEMPLATES_VERSION, period, csrf_secret) + parts)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def cached_response(etag, render, last_modified=None):
+    """Answer 304 if the client has this version already, otherwise render it.
+
+    Responses are private and revalidated on every request, which only costs
+    looking up what goes into the ETag.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return make_response(render())
+    not_modified = "_flashes" not in session and not is_resource_modified(
+        request.environ, etag=etag, last_modified=last_modified
+    )
+    response = make_response("", 304) if not_modified else make_response(render())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@lru_cache(maxsize=TABLE_FRAGMENT_CACHE_SIZE)
+def rendered_table(unique_id, table_version):
+    # the version is part of the key, so an edited table is rendered again
+    tabular = (
+        Image.query.with_entities(Image.tabular).filter_by(uuid=unique_id).scalar()
+    )
+    rows = table_rows_from_json(tabular) if tabular else []
+    return Markup(render_template("_table.html", rows=rows))
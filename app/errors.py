@@ -1,13 +1,35 @@
-from flask import render_template
+from flask import render_template, request
 from app import app, db
+from app.json_api import error_response
+from app.scheduler import ExtractionRejected
+
+
+def wants_json_response():
+    return request.path.startswith('/api/')
 
 
 @app.errorhandler(404)
 def not_found_error(error):
+    if wants_json_response():
+        return error_response(404)
     return render_template('404.html'), 404
 
 
+@app.errorhandler(ExtractionRejected)
+def extraction_rejected_error(error):
+    if wants_json_response():
+        response = error_response(429, str(error))
+    else:
+        response = app.make_response(
+            (render_template('429.html', message=str(error)), 429)
+        )
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
 @app.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
+    if wants_json_response():
+        return error_response(500)
     return render_template('500.html'), 500
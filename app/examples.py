@@ -0,0 +1,94 @@
+import base64
+import json
+import os
+import requests
+from app.models import Blob
+from app.uploads import put_blob_files, put_blob_thumbnails, BLOB_FILE_ENDING
+from aws_helpers import get_url, blob_prefix, content_hash
+from api import analyze, find_number_of_columns_in_image, preprocess_image
+
+EXAMPLES_FILENAME = "examples.json"
+PRECOMPUTED_FILENAME = "precomputed.json"
+
+
+def load_examples(directory):
+    with open(os.path.join(directory, EXAMPLES_FILENAME)) as f:
+        examples = json.load(f)
+    for index, example in enumerate(examples):
+        example["index"] = index
+    return examples
+
+
+def load_precomputed(directory):
+    path = os.path.join(directory, PRECOMPUTED_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def precomputed_content_hashes(directory):
+    # their files are put in the bucket at deploy time, before any blob row
+    return {example["content_hash"] for example in load_precomputed(directory).values()}
+
+
+def write_precomputed(directory, precomputed):
+    with open(os.path.join(directory, PRECOMPUTED_FILENAME), "w") as f:
+        json.dump(precomputed, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+
+def example_path(example, directory):
+    return os.path.join(directory, example["filename"])
+
+
+def read_example_contents(example, directory):
+    path = example_path(example, directory)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def download_example(example, directory):
+    image_response = requests.get(example["url"])
+    image_response.raise_for_status()
+    with open(example_path(example, directory), "wb") as f:
+        f.write(image_response.content)
+
+
+def precompute_example(example, directory):
+    image_contents = read_example_contents(example, directory)
+    hash_of_contents = content_hash(image_contents)
+    preprocessed = preprocess_image(image_contents)
+    put_blob_files(hash_of_contents, preprocessed)
+    put_blob_thumbnails(hash_of_contents, preprocessed["pil_image"])
+    num_columns = find_number_of_columns_in_image(
+        preprocessed["image"], otsu=preprocessed["otsu"]
+    )
+    image_json = {
+        "base64_image": base64.b64encode(preprocessed["image_contents"]),
+        "language": example["language"],
+    }
+    table = analyze(image_json=image_json, number_of_columns=num_columns)
+    return {
+        "content_hash": hash_of_contents,
+        "file_ending": BLOB_FILE_ENDING,
+        "thumbnails_ready": True,
+        "width": preprocessed["pil_image"].width,
+        "height": preprocessed["pil_image"].height,
+        "num_columns": num_columns,
+        "language": example["language"],
+        "tabular": table.to_json(),
+        "layout": table.layout_to_json(),
+    }
+
+
+def thumbnail_url(example, precomputed):
+    if example["filename"] not in precomputed:
+        return example["thumb"]
+    example_precomputed = precomputed[example["filename"]]
+    prefix = blob_prefix(example_precomputed["content_hash"])
+    if not example_precomputed.get("thumbnails_ready", False):
+        return get_url(prefix, Blob.THUMBNAIL_NAME) + "." + BLOB_FILE_ENDING
+    return get_url(prefix, Blob.GRID_THUMBNAILS[0]) + ".jpg"
@@ -15,7 +15,11 @@ from app.models import User
 from flask_uploads import UploadSet, IMAGES
 
 
-language_choices = [("English", "English"), ("Norwegian", "Norwegian")]
+language_choices = [
+    ("English", "English"),
+    ("Norwegian", "Norwegian"),
+    ("Auto", "Detect automatically"),
+]
 default_language = "English"
 
 
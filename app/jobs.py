@@ -0,0 +1,227 @@
+import os
+import socket
+import time
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from app import app, db
+from app.models import Image, Job
+from app.uploads import extract_table, attach_direct_upload
+from app.scheduler import (
+    ACTIVE_STATUSES,
+    admit,
+    claim_limits,
+    lock_claims,
+    next_job_ids,
+    prune_finished_jobs,
+    this_host,
+)
+from api import ImageQualityError
+
+
+def run_extraction(image, number_of_columns, language):
+    extract_table(image, number_of_columns, language)
+
+
+def run_direct_upload(image, number_of_columns, language):
+    # a retry finds the upload attached already and its original deleted
+    if image.blob is None:
+        attach_direct_upload(image)
+    extract_table(image, number_of_columns or image.num_columns, language)
+
+
+HANDLERS = {Job.EXTRACT: run_extraction, Job.DIRECT_UPLOAD: run_direct_upload}
+
+
+def dedup_key(image, number_of_columns, language):
+    # images with the same content give the same table
+    source = image.blob.content_hash if image.blob is not None else image.uuid
+    return f"{source}:{number_of_columns}:{language}"
+
+
+def enqueue(kind, image, number_of_columns, language):
+    key = dedup_key(image, number_of_columns, language)
+    job = image.jobs.filter(
+        Job.kind == kind, Job.dedup_key == key, Job.status.in_(ACTIVE_STATUSES)
+    ).first()
+    if job is not None:  # a double click, the first request is on its way
+        return job
+    admit(image.user)
+    image.status = Image.PROCESSING
+    image.error_message = None
+    job = Job(
+        kind=kind,
+        image=image,
+        num_columns=number_of_columns,
+        language=language,
+        dedup_key=key,
+    )
+    db.session.add(job)
+    db.session.commit()
+    start_local_workers()
+    return job
+
+
+def extract_in_background(image, number_of_columns, language):
+    return enqueue(Job.EXTRACT, image, number_of_columns, language)
+
+
+def process_direct_upload_in_background(image, number_of_columns, language):
+    return enqueue(Job.DIRECT_UPLOAD, image, number_of_columns, language)
+
+
+def stale_before(now):
+    return now - timedelta(seconds=app.config["JOB_VISIBILITY_TIMEOUT"])
+
+
+def claimable(now):
+    return db.or_(
+        db.and_(Job.status == Job.QUEUED, Job.available_at <= now),
+        db.and_(Job.status == Job.RUNNING, Job.heartbeat_at < stale_before(now)),
+    )
+
+
+def claim_job(worker):
+    now = datetime.utcnow()
+    # the usual answer, and much cheaper than putting the jobs in a fair order
+    if not db.session.query(Job.query.filter(claimable(now)).exists()).scalar():
+        return None
+    for job_id in next_job_ids(claimable(now), stale_before(now)):
+        # the update checks the conditions and caps again, so only one worker
+        # wins and two workers can't both take the last free slot
+        lock_claims()
+        claimed = Job.query.filter(
+            Job.id == job_id, claimable(now), *claim_limits(stale_before(now))
+        ).update(
+            {
+                Job.status: Job.RUNNING,
+                Job.worker: worker,
+                Job.host: this_host(),
+                Job.claimed_at: now,
+                Job.heartbeat_at: now,
+                Job.attempts: Job.attempts + 1,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        if claimed:
+            return Job.query.get(job_id)
+    return None
+
+
+def heartbeat(job_id, worker, stop):
+    while not stop.wait(app.config["JOB_HEARTBEAT_INTERVAL"]):
+        with app.app_context():
+            try:
+                Job.query.filter_by(id=job_id, worker=worker).update(
+                    {Job.heartbeat_at: datetime.utcnow()}
+                )
+                db.session.commit()
+            except Exception:
+                app.logger.exception(f"Heartbeat for job {job_id} failed")
+            finally:
+                db.session.remove()
+
+
+def finish_job(job_id):
+    Job.query.filter_by(id=job_id).update(
+        {Job.status: Job.DONE, Job.error_message: None}
+    )
+    db.session.commit()
+
+
+def fail_job(job_id, image_id, attempts, message, retry=True):
+    message = message[: Job.error_message.type.length]
+    if retry and attempts < app.config["JOB_MAX_ATTEMPTS"]:
+        delay = app.config["JOB_RETRY_DELAY"] * 2 ** (attempts - 1)
+        Job.query.filter_by(id=job_id).update(
+            {
+                Job.status: Job.QUEUED,
+                Job.worker: None,
+                Job.host: None,
+                Job.available_at: datetime.utcnow() + timedelta(seconds=delay),
+                Job.error_message: message,
+            }
+        )
+    else:
+        Job.query.filter_by(id=job_id).update(
+            {Job.status: Job.FAILED, Job.error_message: message}
+        )
+        Image.query.filter_by(id=image_id).update(
+            {Image.status: Image.FAILED, Image.error_message: message}
+        )
+    db.session.commit()
+
+
+def run_job(job, worker):
+    # read these up front, the job row goes away if its image is deleted
+    job_id, image_id, attempts = job.id, job.image_id, job.attempts
+    if attempts > app.config["JOB_MAX_ATTEMPTS"]:  # its workers keep dying
+        fail_job(job_id, image_id, attempts, "The worker stopped responding.")
+        return
+    stop = Event()
+    Thread(target=heartbeat, args=(job_id, worker, stop), daemon=True).start()
+    try:
+        if job.image is not None:
+            HANDLERS[job.kind](job.image, job.num_columns, job.language)
+    except ImageQualityError as e:  # the same image fails the same way again
+        db.session.rollback()
+        fail_job(job_id, image_id, attempts, str(e), retry=False)
+    except Exception as e:
+        db.session.rollback()
+        app.logger.exception(f"Job {job_id} failed on attempt {attempts}")
+        fail_job(job_id, image_id, attempts, str(e))
+    else:
+        finish_job(job_id)
+    finally:
+        stop.set()
+
+
+def worker_name(number):
+    return f"{socket.gethostname()}:{os.getpid()}:{number}"[-64:]
+
+
+pruned_at = None
+
+
+def prune_now():
+    # every idle worker would do it, once in a while is plenty
+    global pruned_at
+    if pruned_at is not None and (
+        time.monotonic() - pruned_at < app.config["JOB_PRUNE_INTERVAL"]
+    ):
+        return
+    pruned_at = time.monotonic()
+    prune_finished_jobs(datetime.utcnow())
+
+
+def work(worker, stop=None):
+    while stop is None or not stop.is_set():
+        job = None
+        with app.app_context():
+            try:
+                job = claim_job(worker)
+                if job is not None:
+                    run_job(job, worker)
+                else:
+                    prune_now()
+            except Exception:
+                app.logger.exception(f"Worker {worker} could not run a job")
+            finally:
+                db.session.remove()
+        if job is None:
+            time.sleep(app.config["JOB_POLL_INTERVAL"])
+
+
+local_workers_lock = Lock()
+local_workers_pid = None
+
+
+def start_local_workers():
+    # threads don't survive a fork, so every uWSGI worker starts its own
+    global local_workers_pid
+    with local_workers_lock:
+        if local_workers_pid == os.getpid():
+            return
+        local_workers_pid = os.getpid()
+        for number in range(app.config["JOB_WORKER_THREADS"]):
+            Thread(target=work, args=(worker_name(number),), daemon=True).start()
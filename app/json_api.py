@@ -0,0 +1,286 @@
+import time
+from flask import jsonify, request, url_for, g, Response
+from flask_httpauth import HTTPBasicAuth, HTTPTokenAuth
+from werkzeug.http import HTTP_STATUS_CODES
+from werkzeug.utils import secure_filename
+from app import app, db
+from app.forms import language_choices, default_language
+from app.models import User, Image
+from app.jobs import extract_in_background, process_direct_upload_in_background
+from app.uploads import upload_image, delete_image_and_files
+from app.scheduler import admit
+from app.caching import cached_response
+from aws_helpers import (
+    filename_helper,
+    get_presigned_upload,
+    uploaded_image_size,
+    delete_image_in_bucket,
+    MAX_UPLOAD_SIZE,
+)
+import uuid
+from sqlalchemy.orm import defer, joinedload
+from api import table_rows_from_json, table_rows_to_csv, ImageQualityError
+
+basic_auth = HTTPBasicAuth()
+token_auth = HTTPTokenAuth()
+LANGUAGES = [language for language, _ in language_choices]
+ALLOWED_EXTENSIONS = ["png", "jpg", "jpeg"]
+CONTENT_TYPES = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg"}
+MAX_WAIT_SECONDS = 5  # a waiting request holds one of the few uWSGI processes
+POLL_INTERVAL_SECONDS = 0.5
+
+
+def error_response(status_code, message=None):
+    payload = {"error": HTTP_STATUS_CODES.get(status_code, "Unknown error")}
+    if message:
+        payload["message"] = message
+    response = jsonify(payload)
+    response.status_code = status_code
+    return response
+
+
+def bad_request(message):
+    return error_response(400, message)
+
+
+@basic_auth.verify_password
+def verify_password(username, password):
+    user = User.query.filter_by(username=username).first()
+    if user is not None and user.check_password(password):
+        g.current_user = user
+        return True
+    return False
+
+
+@basic_auth.error_handler
+def basic_auth_error():
+    return error_response(401)
+
+
+@token_auth.verify_token
+def verify_token(token):
+    g.current_user = User.check_token(token) if token else None
+    return g.current_user is not None
+
+
+@token_auth.error_handler
+def token_auth_error():
+    return error_response(401)
+
+
+def get_user_image_or_404(unique_id):
+    return (
+        Image.query.filter_by(uuid=unique_id)
+        .filter_by(user=g.current_user)
+        .first_or_404()
+    )
+
+
+def parse_extraction_arguments(data):
+    language = data.get("language", default_language)
+    if language not in LANGUAGES:
+        return None, None, f"language must be one of {', '.join(LANGUAGES)}"
+    columns = data.get("columns")
+    if columns is None:
+        return None, language, None
+    try:
+        columns = int(columns)
+    except (TypeError, ValueError):
+        columns = 0
+    if columns < 1:
+        return None, None, "columns must be a positive integer"
+    return columns, language, None
+
+
+def job_response(images, rejected=None):
+    data = {
+        "jobs": [
+            dict(image.to_dict(), url=url_for("api_get_image", unique_id=image.uuid))
+            for image in images
+        ]
+    }
+    if rejected:
+        data["rejected"] = rejected
+    response = jsonify(data)
+    response.status_code = 202
+    return response
+
+
+@app.route("/api/tokens", methods=["POST"])
+@basic_auth.login_required
+def api_get_token():
+    token = g.current_user.get_token()
+    db.session.commit()
+    return jsonify({"token": token})
+
+
+@app.route("/api/tokens", methods=["DELETE"])
+@token_auth.login_required
+def api_revoke_token():
+    g.current_user.revoke_token()
+    db.session.commit()
+    return "", 204
+
+
+@app.route("/api/images", methods=["GET"])
+@token_auth.login_required
+def api_get_images():
+    page = request.args.get("page", 1, type=int)
+    images = (
+        g.current_user.images.options(defer(Image.tabular), joinedload(Image.blob))
+        .order_by(Image.timestamp.desc())
+        .paginate(page, app.config["IMAGES_PER_PAGE"], False)
+    )
+    next_url = (
+        url_for("api_get_images", page=images.next_num) if images.has_next else None
+    )
+    prev_url = (
+        url_for("api_get_images", page=images.prev_num) if images.has_prev else None
+    )
+    return jsonify(
+        {
+            "images": [image.to_dict() for image in images.items],
+            "page": images.page,
+            "next_url": next_url,
+            "prev_url": prev_url,
+        }
+    )
+
+
+@app.route("/api/images", methods=["POST"])
+@token_auth.login_required
+def api_create_images():
+    files = request.files.getlist("images")
+    if len(files) == 0:
+        return bad_request("upload one or more files in the images field")
+    columns, language, message = parse_extraction_arguments(request.form)
+    if message:
+        return bad_request(message)
+    for f in files:
+        filename = secure_filename(f.filename)
+        if filename.rpartition(".")[2].lower() not in ALLOWED_EXTENSIONS:
+            return bad_request(f"{f.filename} is not a png or jpg image")
+    admit(g.current_user, len(files))
+    images = []
+    rejected = []
+    for f in files:
+        filename = secure_filename(f.filename)
+        try:
+            unique_id = upload_image(f.read(), filename, g.current_user)
+        except ImageQualityError as e:
+            rejected.append({"filename": filename, "error": str(e)})
+            continue
+        image = Image.query.filter_by(uuid=unique_id).first()
+        extract_in_background(image, columns or image.num_columns, language)
+        images.append(image)
+    if len(images) == 0:
+        return bad_request(rejected[0]["error"])
+    return job_response(images, rejected)
+
+
+@app.route("/api/uploads", methods=["POST"])
+@token_auth.login_required
+def api_create_upload():
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get("filename", ""))
+    _, file_ending = filename_helper(filename)
+    if file_ending.lower() not in ALLOWED_EXTENSIONS:
+        return bad_request("filename must end in .png, .jpg or .jpeg")
+    image = Image(
+        uuid=uuid.uuid4().hex,
+        user=g.current_user,
+        filename=filename,
+        status=Image.AWAITING_UPLOAD,
+    )
+    db.session.add(image)
+    db.session.commit()
+    name, _ = filename_helper(filename)
+    content_type = CONTENT_TYPES[file_ending.lower()]
+    upload = get_presigned_upload(image.uuid, file_ending, name, content_type)
+    response = jsonify(
+        {
+            "id": image.uuid,
+            "upload_url": upload["url"],
+            "method": "POST",
+            "fields": upload["fields"],
+            "max_size": MAX_UPLOAD_SIZE,
+            "complete_url": url_for("api_complete_upload", unique_id=image.uuid),
+        }
+    )
+    response.status_code = 201
+    return response
+
+
+@app.route("/api/uploads/<unique_id>/complete", methods=["POST"])
+@token_auth.login_required
+def api_complete_upload(unique_id):
+    image = get_user_image_or_404(unique_id)
+    if image.status != Image.AWAITING_UPLOAD:
+        return bad_request(f"upload is already completed, status is {image.status}")
+    columns, language, message = parse_extraction_arguments(
+        request.get_json(silent=True) or {}
+    )
+    if message:
+        return bad_request(message)
+    name, file_ending = filename_helper(image.filename)
+    size = uploaded_image_size(image.uuid, file_ending, name)
+    if size is None:
+        return bad_request("nothing has been uploaded to the upload url yet")
+    if size > MAX_UPLOAD_SIZE:  # S3-compatible stand-ins may not check the policy
+        delete_image_in_bucket(image.uuid, file_ending, name)
+        return bad_request(f"the image must be at most {MAX_UPLOAD_SIZE} bytes")
+    process_direct_upload_in_background(image, columns, language)
+    return job_response([image])
+
+
+@app.route("/api/images/<unique_id>", methods=["GET"])
+@token_auth.login_required
+def api_get_image(unique_id):
+    image = get_user_image_or_404(unique_id)
+    try:
+        wait = min(float(request.args.get("wait", 0)), MAX_WAIT_SECONDS)
+    except ValueError:
+        return bad_request("wait must be a number of seconds")
+    deadline = time.monotonic() + wait
+    while image.status == Image.PROCESSING and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL_SECONDS)
+        db.session.refresh(image)
+    return jsonify(image.to_dict())
+
+
+@app.route("/api/images/<unique_id>/extract", methods=["POST"])
+@token_auth.login_required
+def api_extract_image(unique_id):
+    image = get_user_image_or_404(unique_id)
+    columns, language, message = parse_extraction_arguments(
+        request.get_json(silent=True) or {}
+    )
+    if message:
+        return bad_request(message)
+    extract_in_background(image, columns or image.num_columns, language)
+    return job_response([image])
+
+
+@app.route("/api/images/<unique_id>/table", methods=["GET"])
+@token_auth.login_required
+def api_get_table(unique_id):
+    image = get_user_image_or_404(unique_id)
+    if not image.tabular:
+        return error_response(404, f"image has no table yet, status is {image.status}")
+    table_format = "csv" if request.args.get("format") == "csv" else "json"
+
+    def render():
+        rows = table_rows_from_json(image.tabular)
+        if table_format == "csv":
+            return Response(table_rows_to_csv(rows), mimetype="text/csv")
+        return jsonify({"id": image.uuid, "rows": rows})
+
+    etag = f"{image.uuid}-{image.table_version}-{table_format}"
+    return cached_response(etag, render, last_modified=image.table_updated_at)
+
+
+@app.route("/api/images/<unique_id>", methods=["DELETE"])
+@token_auth.login_required
+def api_delete_image(unique_id):
+    delete_image_and_files(get_user_image_or_404(unique_id))
+    return "", 204
@@ -1,11 +1,15 @@
-from datetime import datetime
+import base64
+from datetime import datetime, timedelta
 from hashlib import md5
+import os
 from time import time
 from flask_login import UserMixin
+from sqlalchemy.orm import column_property, deferred
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 from app import app, db, login
-from aws_helpers import get_url, filename_helper
+from aws_helpers import get_url, filename_helper, blob_prefix
+from image_crop import thumbnail_fits
 
 
 class User(UserMixin, db.Model):
@@ -16,6 +20,8 @@ class User(UserMixin, db.Model):
     about_me = db.Column(db.String(140))
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
     images = db.relationship("Image", backref="user", lazy="dynamic")
+    token = db.Column(db.String(32), index=True, unique=True)
+    token_expiration = db.Column(db.DateTime)
 
     def __repr__(self):
         return "<User {}>".format(self.username)
@@ -49,23 +55,161 @@ class User(UserMixin, db.Model):
             return
         return User.query.get(id)
 
+    def get_token(self, expires_in=3600):
+        now = datetime.utcnow()
+        if self.token and self.token_expiration > now + timedelta(seconds=60):
+            return self.token
+        self.token = base64.b64encode(os.urandom(24)).decode("utf-8")
+        self.token_expiration = now + timedelta(seconds=expires_in)
+        db.session.add(self)
+        return self.token
+
+    def revoke_token(self):
+        self.token_expiration = datetime.utcnow() - timedelta(seconds=1)
+
+    @staticmethod
+    def check_token(token):
+        user = User.query.filter_by(token=token).first()
+        if user is None or user.token_expiration < datetime.utcnow():
+            return None
+        return user
+
 
 @login.user_loader
 def load_user(id):
     return User.query.get(int(id))
 
 
+class Blob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), index=True, unique=True, nullable=False)
+    file_ending = db.Column(db.String(10), nullable=False)
+    reference_count = db.Column(db.Integer, nullable=False, default=0)
+    num_columns = db.Column(db.Integer)
+    images = db.relationship("Image", backref="blob", lazy="dynamic")
+    extractions = db.relationship(
+        "Extraction", backref="blob", lazy="dynamic", cascade="all, delete-orphan"
+    )
+    # made in the background after the upload, see uploads.make_thumbnails
+    thumbnails_ready = db.Column(db.Boolean, nullable=False, default=False)
+    # of the stored image; None for blobs stored before it was recorded
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    # set when the last image is deleted; the row goes once its files are gone
+    deleting_since = db.Column(db.DateTime)
+    IMAGE_NAME = "image"
+    THUMBNAIL_NAME = "image_thumbnail"  # the single PNG thumbnail of older blobs
+    # name: (width, square, formats); the listing tile at 1x and 2x, and the
+    # image page, where a JPEG of the scan would be bigger than the PNG
+    THUMBNAIL_SIZES = {
+        "image_thumbnail_400": (400, True, ["webp", "jpg"]),
+        "image_thumbnail_800": (800, True, ["webp", "jpg"]),
+        "image_detail": (1200, False, ["webp"]),
+    }
+    GRID_THUMBNAILS = ["image_thumbnail_400", "image_thumbnail_800"]
+    DETAIL_THUMBNAIL = "image_detail"
+
+    @classmethod
+    def thumbnail_sizes_for(cls, width, height):
+        # the smallest tile is always made, so every blob has a thumbnail
+        return {
+            name: size
+            for name, size in cls.THUMBNAIL_SIZES.items()
+            if name == cls.GRID_THUMBNAILS[0] or thumbnail_fits(width, height, size)
+        }
+
+    def thumbnail_sizes(self):
+        if self.width is None:  # made before larger sizes were skipped
+            return self.THUMBNAIL_SIZES
+        return self.thumbnail_sizes_for(self.width, self.height)
+
+    def image_url(self):
+        prefix = blob_prefix(self.content_hash)
+        return get_url(prefix, self.IMAGE_NAME) + "." + self.file_ending
+
+    def sized_url(self, name, file_ending):
+        return get_url(blob_prefix(self.content_hash), name) + "." + file_ending
+
+    def thumbnail_url(self):
+        if not self.thumbnails_ready:
+            return self.image_url()
+        return self.sized_url(self.GRID_THUMBNAILS[0], "jpg")
+
+    def thumbnail_srcset(self, file_ending):
+        if not self.thumbnails_ready:
+            return None
+        sizes = self.thumbnail_sizes()
+        return ", ".join(
+            f"{self.sized_url(name, file_ending)} {sizes[name][0]}w"
+            for name in self.GRID_THUMBNAILS
+            if name in sizes
+        )
+
+    def detail_url(self):
+        # without it the page shows the stored image, which is as sharp
+        if (
+            not self.thumbnails_ready
+            or self.DETAIL_THUMBNAIL not in self.thumbnail_sizes()
+        ):
+            return None
+        return self.sized_url(self.DETAIL_THUMBNAIL, "webp")
+
+    def __repr__(self):
+        return "<Blob {}>".format(self.content_hash)
+
+
+class Extraction(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    blob_id = db.Column(db.Integer, db.ForeignKey("blob.id"), nullable=False)
+    num_columns = db.Column(db.Integer, nullable=False)
+    language = db.Column(db.String(32), nullable=False)
+    MAX_JSON_CHARACTER_COUNT = 10000
+    tabular = db.Column(db.String(MAX_JSON_CHARACTER_COUNT), nullable=False)
+    # column boundaries and word boxes, see api.table_layout
+    layout = deferred(db.Column(db.Text))
+    __table_args__ = (db.UniqueConstraint("blob_id", "num_columns", "language"),)
+
+    def __repr__(self):
+        return "<Extraction {} {} {}>".format(
+            self.blob_id, self.num_columns, self.language
+        )
+
+
 class Image(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     uuid = db.Column(db.String(32), nullable=False)  # all uuid hexes are 32 long
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    blob_id = db.Column(db.Integer, db.ForeignKey("blob.id"), index=True)
     filename = db.Column(db.String(140), nullable=False)
     MAX_JSON_CHARACTER_COUNT = 10000
     tabular = db.Column(db.String(MAX_JSON_CHARACTER_COUNT))
+    # lets listings check for a table while tabular itself is deferred
+    has_tabular = column_property(tabular.isnot(None))
+    layout = deferred(db.Column(db.Text))
+    # bumped whenever tabular changes, for ETags and the rendered table cache
+    table_version = db.Column(db.Integer, nullable=False, default=0)
+    table_updated_at = db.Column(db.DateTime)
     num_columns = db.Column(db.Integer)
+    AWAITING_UPLOAD = "awaiting_upload"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+    status = db.Column(db.String(16))
+    error_message = db.Column(db.String(140))
+    __table_args__ = (db.Index("ix_image_user_id_uuid", "user_id", "uuid"),)
+    jobs = db.relationship(
+        "Job", backref="image", lazy="dynamic", cascade="all, delete-orphan"
+    )
+
+    def table_changed(self):
+        # counted in SQL, so two edits at once can't share a version
+        self.table_version = Image.table_version + 1
+        self.table_updated_at = datetime.utcnow()
 
     def image_url(self):
+        if self.blob is not None:
+            return self.blob.image_url()
         filename, file_ending = filename_helper(self.filename)
         return get_url(self.uuid, filename) + "." + file_ending
 
@@ -80,8 +224,69 @@ class Image(db.Model):
         return get_url(self.uuid, filename) + "." + file_ending
 
     def thumbnail_url(self):
+        if self.blob is not None:
+            return self.blob.thumbnail_url()
         filename, file_ending = filename_helper(self.filename)
         return get_url(self.uuid, filename) + "_thumbnail" + "." + file_ending
 
+    def thumbnail_srcset(self, file_ending):
+        if self.blob is None:
+            return None
+        return self.blob.thumbnail_srcset(file_ending)
+
+    def detail_url(self):
+        if self.blob is None:
+            return None
+        return self.blob.detail_url()
+
+    def to_dict(self):
+        data = {
+            "id": self.uuid,
+            "filename": self.filename,
+            "timestamp": self.timestamp.isoformat() + "Z",
+            "status": self.status,
+            "num_columns": self.num_columns,
+            "image_url": self.image_url(),
+            "thumbnail_url": self.thumbnail_url(),
+        }
+        if self.error_message:
+            data["error"] = self.error_message
+        if self.has_tabular:
+            data["excel_url"] = self.excel_url()
+            data["csv_url"] = self.csv_url()
+        return data
+
     def __repr__(self):
         return "<Image {}>".format(self.uuid)
+
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    EXTRACT = "extract"
+    DIRECT_UPLOAD = "direct_upload"
+    kind = db.Column(db.String(16), nullable=False)
+    image_id = db.Column(db.Integer, db.ForeignKey("image.id"), index=True)
+    num_columns = db.Column(db.Integer)
+    language = db.Column(db.String(32))
+    # identical extractions share a key, so only one of them runs at a time
+    dedup_key = db.Column(db.String(120), index=True)
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    status = db.Column(db.String(16), nullable=False, default=QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    available_at = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime, index=True)
+    heartbeat_at = db.Column(db.DateTime)
+    worker = db.Column(db.String(64))
+    # whole, as worker names are cut short; OCR_SLOTS counts the jobs per host
+    host = db.Column(db.String(255))
+    error_message = db.Column(db.String(140))
+
+    # workers look for claimable jobs every second, whether or not there are any
+    __table_args__ = (db.Index("ix_job_status_available_at", "status", "available_at"),)
+
+    def __repr__(self):
+        return "<Job {} {} {}>".format(self.id, self.kind, self.status)
@@ -1,4 +1,5 @@
-from flask import render_template, flash, redirect, url_for, request
+import json
+from flask import render_template, flash, redirect, url_for, request, jsonify
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.urls import url_parse
 from app import app, db
@@ -13,28 +14,34 @@ from app.forms import (
 )
 from app.models import User, Image
 from app.email import send_password_reset_email
+from app.uploads import (
+    upload_image,
+    delete_image_and_files,
+    add_precomputed_image,
+    store_table_files,
+)
+from app.jobs import extract_in_background
+from app.scheduler import admit
+from app.examples import (
+    load_examples,
+    load_precomputed,
+    read_example_contents,
+    thumbnail_url,
+)
 from werkzeug.utils import secure_filename
+from sqlalchemy.orm import defer, joinedload
 from flask_uploads import UploadSet, IMAGES
-from aws_helpers import (
-    put_image_in_bucket,
-    delete_all_files_for_image,
-    put_excel_file_in_bucket,
-    delete_remote_excel,
-    put_csv_file_in_bucket,
-    filename_helper,
+from aws_helpers import delete_table_files
+from app.json_api import bad_request
+from app.caching import cached_response, page_etag, rendered_table
+from api import (
+    table_rows_from_json,
+    table_rows_to_json,
+    move_dividing_points,
+    ImageQualityError,
 )
-import uuid
-from threading import Thread
-import pandas as pd
-from api import analyze, find_number_of_columns, resize_image
-import base64
 import requests
-import io
-from image_crop import thumbnail
-from PIL import Image as PILImage
-import numpy as np
-
-DPI = 300
+from threading import Thread
 
 photos = UploadSet("photos", IMAGES)
 
@@ -44,54 +51,20 @@ def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def upload_image(image_contents, full_filename):
-    unique_id = uuid.uuid4().hex
-    filename, file_ending = filename_helper(full_filename)
-    put_image_in_bucket(unique_id, image_contents, file_ending, filename)
-    thumbnail_image_contents = thumbnail(image_contents, N=200)
-    thumbnail_filename = f"{filename}_thumbnail"
-    put_image_in_bucket(
-        unique_id, thumbnail_image_contents, file_ending, thumbnail_filename
-    )
-    Thread(
-        target=put_image_in_bucket,
-        args=(unique_id, image_contents, file_ending, filename),
-    ).start()
-    base64_encoded_image = base64.b64encode(image_contents)
-    image_json = {"base64_image": base64_encoded_image}
-    num_columns = find_number_of_columns(image_json)
-    image = Image(
-        uuid=unique_id,
-        user=current_user,
-        filename=full_filename,
-        num_columns=num_columns,
-    )
-    db.session.add(image)
-    db.session.commit()
-    return unique_id
-
-
 @app.route("/", methods=["GET", "POST"])
 @app.route("/index", methods=["GET", "POST"])
 @login_required
 def index():
     form = PhotoForm()
     if form.validate_on_submit():
+        admit(current_user)
         f = form.photo.data
         full_filename = secure_filename(f.filename)
-        image_contents = f.read()
-        image_as_byte_array = np.frombuffer(image_contents, np.uint8)
-        resized_image_as_byte_array = resize_image(image_as_byte_array)
-
-        pil_image = PILImage.open(io.BytesIO(resized_image_as_byte_array))
-
-        with io.BytesIO() as output:
-            pil_image.save(
-                output, format="PNG", dpi=(DPI, DPI)
-            )  # 300*300 DPI is best for OCR
-            image_contents = output.getvalue()
-
-        unique_id = upload_image(image_contents, full_filename)
+        try:
+            unique_id = upload_image(f.read(), full_filename, current_user)
+        except ImageQualityError as e:
+            flash(str(e))
+            return redirect(url_for("index"))
         image = (
             Image.query.filter_by(uuid=unique_id)
             .filter_by(user=current_user)
@@ -99,8 +72,7 @@ def index():
         )
         language = form.data["language"]
         return extract_from_image(unique_id, image.num_columns, language)
-    images = list(reversed(Image.query.filter_by(user=current_user).all()))
-    user_has_images = len(images) > 0
+    user_has_images = db.session.query(current_user.images.exists()).scalar()
     return render_template(
         "index.html", form=form, title="Home", user_has_images=user_has_images
     )
@@ -189,11 +161,8 @@ def delete_image(unique_id):
         .filter_by(user=current_user)
         .first_or_404()
     )
-    db.session.delete(image)
-    db.session.commit()
+    delete_image_and_files(image)
     flash("Image deleted.")
-    filename = image.filename
-    Thread(target=delete_all_files_for_image, args=(unique_id, filename)).start()
     return redirect(url_for("index"))
 
 
@@ -206,13 +175,14 @@ def delete_table(unique_id):
         .first_or_404()
     )
     image.tabular = None
+    image.layout = None
+    image.table_changed()
     filename = image.filename
-    delete_remote_excel(unique_id, filename)
+    delete_table_files(unique_id, filename)
     db.session.commit()
     return redirect(url_for("image", unique_id=unique_id))
 
 
-@app.route("/extract_from_image/<unique_id>/<int:number_of_columns>")
 @login_required
 def extract_from_image(unique_id, number_of_columns, language):
     if number_of_columns < 1:
@@ -223,42 +193,7 @@ def extract_from_image(unique_id, number_of_columns, language):
         .filter_by(user=current_user)
         .first_or_404()
     )
-    # Fetch image from AWS S3:
-    image_response = requests.get(image.image_url())
-    if not image_response.status_code == 200:
-        if image_response.status_code == 403:
-            flash(
-                "Image could not be retrieved, perhaps it had not finished uploading. Please try again."
-            )
-        else:
-            flash("Something went wrong with getting the image from the internet.")
-        return redirect(url_for("index"))
-    image_content = image_response.content
-    base64_encoded_image = base64.b64encode(image_content)
-    image_json = {"base64_image": base64_encoded_image, "language": language}
-    df_json = analyze(image_json=image_json, number_of_columns=number_of_columns)["df"]
-    df = pd.read_json(df_json, orient="split")
-    df.index = pd.RangeIndex(start=1, stop=(len(df.index) + 1))
-    df.columns = pd.RangeIndex(start=1, stop=(len(df.columns) + 1))
-    with io.BytesIO() as output:
-        writer = pd.ExcelWriter(output, engine="xlsxwriter")
-        df.to_excel(writer, header=None, index=None)
-        writer.save()
-        excel_binary_data = output.getvalue()
-        filename, _ = filename_helper(image.filename)
-    Thread(
-        target=put_excel_file_in_bucket, args=(unique_id, excel_binary_data, filename)
-    ).start()
-    with io.StringIO() as output:
-        df.to_csv(output, header=None, index=None)
-        contents = output.getvalue()
-        csv_binary_data = str.encode(contents)
-    Thread(
-        target=put_csv_file_in_bucket, args=(unique_id, csv_binary_data, filename)
-    ).start()
-    image.tabular = df_json
-    db.session.add(image)
-    db.session.commit()
+    extract_in_background(image, number_of_columns, language)
     return redirect(url_for("image", unique_id=unique_id))
 
 
@@ -266,7 +201,8 @@ def extract_from_image(unique_id, number_of_columns, language):
 @login_required
 def image(unique_id):
     image = (
-        Image.query.filter_by(uuid=unique_id)
+        Image.query.options(defer(Image.tabular))
+        .filter_by(uuid=unique_id)
         .filter_by(user=current_user)
         .first_or_404()
     )
@@ -279,96 +215,156 @@ def image(unique_id):
     if form_again.validate_on_submit():
         number_of_columns = form_again.columns.data
         language = form_again.language.data
-        return extract_from_image(unique_id, number_of_columns, anguage=language)
-    if image.tabular:
-        df_json = image.tabular
-        df = pd.read_json(df_json, orient="split")
-        df.index = pd.RangeIndex(start=1, stop=(len(df.index) + 1))
-        df.columns = pd.RangeIndex(start=1, stop=(len(df.columns) + 1))
-        rows = df.values.tolist()
-    else:
-        rows = None
-    return render_template(
-        "image.html", image=image, form=form, rows=rows, form_again=form_again
+        return extract_from_image(unique_id, number_of_columns, language=language)
+
+    def render():
+        table = None
+        layout = None
+        if image.has_tabular:
+            table = rendered_table(image.uuid, image.table_version)
+            layout = json.loads(image.layout) if image.layout else None
+        return render_template(
+            "image.html",
+            image=image,
+            form=form,
+            table=table,
+            form_again=form_again,
+            layout_width=layout and layout["width"],
+            dividing_points=layout and layout["dividing_points"],
+        )
+
+    etag = page_etag(
+        current_user.id,
+        current_user.username,
+        image.uuid,
+        image.status,
+        image.error_message,
+        image.table_version,
+        image.blob is not None and image.blob.thumbnails_ready,
+    )
+    return cached_response(etag, render)
+
+
+def parse_dividing_points(data, layout):
+    points = data.get("dividing_points") if isinstance(data, dict) else None
+    if not isinstance(points, list) or len(points) != len(layout["dividing_points"]):
+        return None
+    if not all(type(point) is int for point in points):
+        return None
+    bounds = [0] + points + [layout["width"]]
+    if not all(a < b for a, b in zip(bounds, bounds[1:])):
+        return None
+    return points
+
+
+@app.route("/image/<unique_id>/columns", methods=["POST"])
+@login_required
+def move_columns(unique_id):
+    image = (
+        Image.query.filter_by(uuid=unique_id)
+        .filter_by(user=current_user)
+        .first_or_404()
+    )
+    # a form can't post JSON from another site, so this stands in for a CSRF token
+    if not request.is_json:
+        return bad_request("The column boundaries must be sent as JSON.")
+    if not image.tabular or not image.layout:
+        return bad_request("Extract the table again to move its columns.")
+    layout = json.loads(image.layout)
+    points = parse_dividing_points(request.get_json(silent=True), layout)
+    if points is None:
+        return bad_request(
+            "dividing_points must be increasing whole numbers inside the image, "
+            "one for every boundary between columns."
+        )
+    rows = table_rows_from_json(image.tabular)
+    changed = move_dividing_points(rows, layout, points)
+    image.tabular = table_rows_to_json(rows)
+    image.layout = json.dumps(layout)
+    image.table_changed()
+    db.session.commit()
+    if changed:
+        Thread(
+            target=store_table_files, args=(image.uuid, image.filename, rows)
+        ).start()
+    return jsonify(
+        {
+            "dividing_points": points,
+            "changed": [
+                {"row": row, "column": column, "text": text}
+                for row, column, text in changed
+            ],
+        }
     )
 
 
 @app.route("/delete_all_images/")
 @login_required
 def delete_all_images():
-    images = list(reversed(Image.query.filter_by(user=current_user).all()))
+    images = current_user.images.options(defer(Image.tabular)).all()
     for image in images:
-        Thread(target=delete_all_files_for_image, args=(image.uuid,)).start()
-        db.session.delete(image)
-        db.session.commit()
+        delete_image_and_files(image)
     if len(images) > 0:
         flash("All images were deleted.")
     return redirect(url_for("index"))
 
 
-image_dicts = [
-    {
-        "thumb": "http://vegardstikbakke.com/assets/img/example1_thumb.png",
-        "language": "Norwegian",
-        "url": "http://vegardstikbakke.com/assets/img/example1.png",
-        "filename": "example1.png",
-        "index": 0,
-    },
-    {
-        "thumb": "http://vegardstikbakke.com/assets/img/example2_thumb.png",
-        "language": "Norwegian",
-        "url": "http://vegardstikbakke.com/assets/img/example2.png",
-        "filename": "example2.png",
-        "index": 1,
-    },
-    {
-        "thumb": "http://vegardstikbakke.com/assets/img/example3_thumb.png",
-        "language": "Norwegian",
-        "url": "http://vegardstikbakke.com/assets/img/example3.png",
-        "filename": "example3.png",
-        "index": 2,
-    },
-    {
-        "thumb": "http://vegardstikbakke.com/assets/img/example4_thumb.png",
-        "language": "Norwegian",
-        "url": "http://vegardstikbakke.com/assets/img/example4.png",
-        "filename": "example4.png",
-        "index": 3,
-    },
-]
+examples = load_examples(app.config["EXAMPLES_DIRECTORY"])
+example_cache = load_precomputed(app.config["EXAMPLES_DIRECTORY"])
 
 
 @app.route("/add_example_image/<int:index>")
 @login_required
 def add_example_image(index):
-    image_dict = image_dicts[index]
-    example_image_url = image_dict["url"]
-    example_filename = image_dict["filename"]
-    image_response = requests.get(example_image_url)
-    if not image_response.status_code == 200:
-        flash("The example image could not be retrieved.")
-        return redirect(url_for("index"))
-    image_contents = image_response.content
-    unique_id = upload_image(image_contents, example_filename)
+    example = examples[index]
+    example_filename = example["filename"]
+    precomputed = example_cache.get(example_filename)
+    if precomputed is not None:
+        unique_id = add_precomputed_image(precomputed, example_filename, current_user)
+        return redirect(url_for("image", unique_id=unique_id))
+    admit(current_user)
+    image_contents = read_example_contents(example, app.config["EXAMPLES_DIRECTORY"])
+    if image_contents is None:
+        image_response = requests.get(example["url"])
+        if not image_response.status_code == 200:
+            flash("The example image could not be retrieved.")
+            return redirect(url_for("index"))
+        image_contents = image_response.content
+    unique_id = upload_image(image_contents, example_filename, current_user)
     image = (
         Image.query.filter_by(uuid=unique_id)
         .filter_by(user=current_user)
         .first_or_404()
     )
-    language = image_dict["language"]
+    language = example["language"]
     return extract_from_image(unique_id, image.num_columns, language)
 
 
 @app.route("/images/")
 @login_required
 def all_images():
-    images = list(reversed(Image.query.filter_by(user=current_user).all()))
-    return render_template("all_images.html", title="All images", images=images)
+    page = request.args.get("page", 1, type=int)
+    images = (
+        current_user.images.options(defer(Image.tabular), joinedload(Image.blob))
+        .order_by(Image.timestamp.desc())
+        .paginate(page, app.config["IMAGES_PER_PAGE"], False)
+    )
+    next_url = url_for("all_images", page=images.next_num) if images.has_next else None
+    prev_url = url_for("all_images", page=images.prev_num) if images.has_prev else None
+    return render_template(
+        "all_images.html",
+        title="All images",
+        images=images.items,
+        next_url=next_url,
+        prev_url=prev_url,
+    )
 
 
 @app.route("/example_images/")
 @login_required
 def example_images():
-    return render_template(
-        "example_images.html", title="Example images", images=image_dicts
-    )
+    images = [
+        {"index": example["index"], "thumb": thumbnail_url(example, example_cache)}
+        for example in examples
+    ]
+    return render_template("example_images.html", title="Example images", images=images)
@@ -0,0 +1,164 @@
+import math
+import os
+import socket
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from app import app, db
+from app.models import Image, Job
+
+ACTIVE_STATUSES = [Job.QUEUED, Job.RUNNING]
+CLAIM_LOCK = 42  # key of the Postgres advisory lock held while claiming a job
+
+
+class ExtractionRejected(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after(jobs_ahead):
+    # rough estimate of how long the jobs ahead take to clear the slots
+    slots = app.config["OCR_SLOTS"]
+    seconds = math.ceil(jobs_ahead / slots) * app.config["ESTIMATED_JOB_SECONDS"]
+    return max(seconds, 1)
+
+
+def admit(user, number_of_jobs=1):
+    """Raise ExtractionRejected unless the user may queue this many more jobs."""
+    pending_for_user = (
+        Job.query.join(Image)
+        .filter(Image.user_id == user.id, Job.status.in_(ACTIVE_STATUSES))
+        .count()
+    )
+    if pending_for_user + number_of_jobs > app.config["MAX_PENDING_JOBS_PER_USER"]:
+        raise ExtractionRejected(
+            "You have too many extractions waiting already. Please try again soon.",
+            retry_after(pending_for_user),
+        )
+    queued = Job.query.filter_by(status=Job.QUEUED).count()
+    if queued + number_of_jobs > app.config["MAX_QUEUED_JOBS"]:
+        raise ExtractionRejected(
+            "The server is busy extracting other tables. Please try again soon.",
+            retry_after(queued),
+        )
+
+
+def this_host():
+    return socket.gethostname()
+
+
+def running_since(stale_before, job=Job):
+    # jobs whose worker stopped sending heartbeats don't hold on to their slot
+    return db.and_(job.status == Job.RUNNING, job.heartbeat_at >= stale_before)
+
+
+def free_slots_on_host(stale_before):
+    running_here = Job.query.filter(
+        running_since(stale_before), Job.host == this_host()
+    ).count()
+    return app.config["OCR_SLOTS"] - running_here
+
+
+def next_job_ids(claimable, stale_before, limit=10):
+    """Claimable jobs in fair order, skipping users at their concurrency cap.
+
+    Users with the fewest running jobs go first, then the one who was served
+    least recently, so one user's backlog can't hold up everyone else.
+    """
+    if free_slots_on_host(stale_before) <= 0:
+        return []
+    # users last served before the window count as never served, so only the
+    # recent rows are grouped rather than every job there has been
+    fairness_window = timedelta(seconds=app.config["JOB_FAIRNESS_WINDOW"])
+    served_since = datetime.utcnow() - fairness_window
+    per_user = (
+        db.session.query(
+            Image.user_id.label("user_id"),
+            func.sum(db.case([(running_since(stale_before), 1)], else_=0)).label(
+                "running"
+            ),
+            func.max(Job.claimed_at).label("last_claimed_at"),
+        )
+        .join(Job, Job.image_id == Image.id)
+        .filter(db.or_(Job.status == Job.RUNNING, Job.claimed_at >= served_since))
+        .group_by(Image.user_id)
+        .subquery()
+    )
+    # a job waits while an identical one runs, then finds its extraction stored
+    running_keys = db.session.query(Job.dedup_key).filter(
+        running_since(stale_before), Job.dedup_key.isnot(None)
+    )
+    running = func.coalesce(per_user.c.running, 0)
+    last_claimed_at = func.coalesce(per_user.c.last_claimed_at, datetime.min)
+    return [
+        job_id
+        for (job_id,) in db.session.query(Job.id)
+        .join(Image, Job.image_id == Image.id)
+        .outerjoin(per_user, per_user.c.user_id == Image.user_id)
+        .filter(claimable)
+        .filter(db.or_(Job.dedup_key.is_(None), ~Job.dedup_key.in_(running_keys)))
+        .filter(running < app.config["MAX_RUNNING_JOBS_PER_USER"])
+        .order_by(running, last_claimed_at, Job.available_at)
+        .limit(limit)
+        .all()
+    ]
+
+
+def prune_finished_jobs(now):
+    cutoff = now - timedelta(seconds=app.config["JOB_RETENTION"])
+    Job.query.filter(
+        Job.status.in_([Job.DONE, Job.FAILED]), Job.available_at < cutoff
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def claim_limits(stale_before):
+    """Conditions for the update that claims a job, so the caps hold however
+    many workers claim at once rather than only when next_job_ids ran."""
+    running = aliased(Job)
+    running_image = aliased(Image)
+    running_here = (
+        db.session.query(func.count(running.id))
+        .filter(running_since(stale_before, running), running.host == this_host())
+        .as_scalar()
+    )
+    user_id = (
+        db.session.query(Image.user_id)
+        .filter(Image.id == Job.image_id)
+        .correlate(Job)  # the job being claimed
+    )
+    running_for_user = (
+        db.session.query(func.count(running.id))
+        .join(running_image, running.image_id == running_image.id)
+        .filter(
+            running_since(stale_before, running),
+            running_image.user_id == user_id.as_scalar(),
+        )
+        .as_scalar()
+    )
+    identical_running = (
+        db.session.query(running.id)
+        .filter(
+            running_since(stale_before, running), running.dedup_key == Job.dedup_key
+        )
+        .correlate(Job)
+        .exists()
+    )
+    return [
+        running_here < app.config["OCR_SLOTS"],
+        running_for_user < app.config["MAX_RUNNING_JOBS_PER_USER"],
+        ~identical_running,
+    ]
+
+
+def lock_claims():
+    # Postgres checks each update against its own snapshot, so two workers
+    # could both take the last slot; SQLite runs one write at a time anyway
+    if db.engine.dialect.name == "postgresql":
+        db.session.execute("SELECT pg_advisory_xact_lock(:key)", {"key": CLAIM_LOCK})
+
+
+# Tesseract starts a thread per core for every page, which oversubscribes the
+# CPU when OCR_SLOTS pages are read at once
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
@@ -0,0 +1,77 @@
+// Lets the column boundaries be dragged over the image. Only the cells that
+// change are sent back, so the table updates without reading the image again.
+(function () {
+    var container = document.querySelector(".column-image");
+    var width = Number(container.dataset.width);
+    var points = JSON.parse(container.dataset.points);
+    var lines = [];
+    var dragging = null;
+
+    function place(line, point) {
+        line.style.left = (100 * point / width) + "%";
+    }
+
+    function pointAt(event) {
+        var bounds = container.getBoundingClientRect();
+        var point = Math.round((event.clientX - bounds.left) / bounds.width * width);
+        // keep the boundaries in order, one pixel apart at least
+        var lower = dragging > 0 ? points[dragging - 1] + 1 : 1;
+        var upper = dragging < points.length - 1 ? points[dragging + 1] - 1 : width - 1;
+        return Math.min(Math.max(point, lower), upper);
+    }
+
+    function updateCells(changed) {
+        changed.forEach(function (cell) {
+            var td = document.querySelector(
+                'td[data-row="' + cell.row + '"][data-column="' + cell.column + '"]'
+            );
+            if (td) {
+                td.textContent = cell.text;
+            }
+        });
+    }
+
+    function send() {
+        fetch(container.dataset.url, {
+            method: "POST",
+            credentials: "same-origin",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({dividing_points: points})
+        }).then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.statusText);
+            }
+            return response.json();
+        }).then(function (data) {
+            updateCells(data.changed);
+        }).catch(function () {
+            window.location.reload();
+        });
+    }
+
+    points.forEach(function (point, i) {
+        var line = document.createElement("div");
+        line.className = "column-boundary";
+        place(line, point);
+        line.addEventListener("mousedown", function (event) {
+            event.preventDefault();
+            dragging = i;
+        });
+        container.appendChild(line);
+        lines.push(line);
+    });
+
+    document.addEventListener("mousemove", function (event) {
+        if (dragging !== null) {
+            points[dragging] = pointAt(event);
+            place(lines[dragging], points[dragging]);
+        }
+    });
+
+    document.addEventListener("mouseup", function () {
+        if (dragging !== null) {
+            dragging = null;
+            send();
+        }
+    });
+})();
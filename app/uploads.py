@@ -0,0 +1,350 @@
+from app import app, db
+from app.models import Image, Blob, Extraction
+from aws_helpers import (
+    put_image_in_bucket,
+    delete_all_files_for_image,
+    get_image_from_bucket,
+    delete_image_in_bucket,
+    put_excel_file_in_bucket,
+    put_csv_file_in_bucket,
+    filename_helper,
+    content_hash,
+    blob_prefix,
+    IMMUTABLE_CACHE_CONTROL,
+    gather,
+)
+from image_crop import thumbnails_from_image
+from sqlalchemy.exc import IntegrityError
+import base64
+import requests
+import uuid
+import time
+from datetime import datetime, timedelta
+from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from api import (
+    analyze,
+    find_number_of_columns_in_image,
+    preprocess_image,
+    table_rows_from_json,
+    table_rows_to_csv,
+    table_rows_to_excel,
+)
+
+BLOB_FILE_ENDING = "png"  # preprocessing always produces PNG data
+BLOB_DELETE_POLL_INTERVAL = 0.2  # seconds
+
+
+class ImageNotAvailableError(Exception):
+    pass
+
+
+# thumbnails are made after the upload has been answered
+thumbnail_executor = ThreadPoolExecutor(
+    max_workers=app.config["THUMBNAIL_THREADS"], thread_name_prefix="thumbnails"
+)
+
+
+def add_blob(blob):
+    db.session.add(blob)
+    try:
+        db.session.commit()
+    except IntegrityError:  # an identical upload finished first
+        db.session.rollback()
+        blob = Blob.query.filter_by(content_hash=blob.content_hash).first()
+    return blob
+
+
+def put_blob_files(content_hash, preprocessed):
+    put_image_in_bucket(
+        blob_prefix(content_hash),
+        preprocessed["image_contents"],
+        BLOB_FILE_ENDING,
+        Blob.IMAGE_NAME,
+        cache_control=IMMUTABLE_CACHE_CONTROL,
+    )
+
+
+def put_blob_thumbnails(content_hash, pil_image):
+    prefix = blob_prefix(content_hash)
+    sizes = Blob.thumbnail_sizes_for(*pil_image.size)
+    thumbnails = thumbnails_from_image(pil_image, sizes)
+    puts = [
+        (put_image_in_bucket, prefix, contents, ending, name, IMMUTABLE_CACHE_CONTROL)
+        for name, ending, contents in thumbnails
+    ]
+    gather(*puts)
+
+
+def make_thumbnails(blob_id, content_hash, pil_image):
+    try:
+        put_blob_thumbnails(content_hash, pil_image)
+        with app.app_context():
+            Blob.query.filter_by(id=blob_id).update({Blob.thumbnails_ready: True})
+            db.session.commit()
+    except Exception:
+        app.logger.exception(f"Thumbnails for blob {content_hash} failed")
+
+
+def store_blob(image_contents, content_hash):
+    preprocessed = preprocess_image(image_contents)
+    put_blob_files(content_hash, preprocessed)
+    num_columns = find_number_of_columns_in_image(
+        preprocessed["image"], otsu=preprocessed["otsu"]
+    )
+    blob = Blob(
+        content_hash=content_hash,
+        file_ending=BLOB_FILE_ENDING,
+        num_columns=num_columns,
+        width=preprocessed["pil_image"].width,
+        height=preprocessed["pil_image"].height,
+        reference_count=0,
+    )
+    blob = add_blob(blob)
+    if not blob.thumbnails_ready:
+        thumbnail_executor.submit(
+            make_thumbnails, blob.id, content_hash, preprocessed["pil_image"]
+        )
+    return blob
+
+
+def reference_blob(blob):
+    incremented = Blob.query.filter_by(id=blob.id, deleting_since=None).update(
+        {Blob.reference_count: Blob.reference_count + 1}
+    )
+    return incremented > 0
+
+
+def remove_blob(blob_id):
+    Extraction.query.filter_by(blob_id=blob_id).delete()
+    Blob.query.filter_by(id=blob_id).delete()
+    db.session.commit()
+
+
+def wait_for_blob_deletion(blob):
+    # storing the files again before the old ones are gone would lose them to
+    # the delete; one that never finished, as its worker died, is taken over
+    timeout = timedelta(seconds=app.config["BLOB_DELETE_TIMEOUT"])
+    while db.session.query(Blob.id).filter_by(id=blob.id).first() is not None:
+        if datetime.utcnow() - blob.deleting_since > timeout:
+            remove_blob(blob.id)
+            return
+        time.sleep(BLOB_DELETE_POLL_INTERVAL)
+
+
+def acquire_blob(image_contents):
+    hash_of_contents = content_hash(image_contents)
+    blob = Blob.query.filter_by(content_hash=hash_of_contents).first()
+    if blob is not None and blob.deleting_since is not None:
+        wait_for_blob_deletion(blob)
+        return acquire_blob(image_contents)
+    if blob is None:
+        blob = store_blob(image_contents, hash_of_contents)
+    if not reference_blob(blob):  # the blob was released while we looked at it
+        return acquire_blob(image_contents)
+    return blob
+
+
+def find_or_add_precomputed_blob(precomputed):
+    # the files were put in the bucket when the example was precomputed
+    blob = Blob.query.filter_by(content_hash=precomputed["content_hash"]).first()
+    if blob is None:
+        blob = Blob(
+            content_hash=precomputed["content_hash"],
+            file_ending=precomputed["file_ending"],
+            num_columns=precomputed["num_columns"],
+            thumbnails_ready=precomputed.get("thumbnails_ready", False),
+            width=precomputed.get("width"),
+            height=precomputed.get("height"),
+            reference_count=0,
+        )
+        blob = add_blob(blob)
+    return blob
+
+
+def release_blob(blob):
+    # returns whether this was the last reference, so the blob can go too
+    Blob.query.filter_by(id=blob.id).update(
+        {Blob.reference_count: Blob.reference_count - 1}
+    )
+    db.session.refresh(blob)
+    return blob.reference_count == 0
+
+
+def delete_files(prefix):
+    # anything left behind is picked up by cleanup_storage.py
+    try:
+        errors = delete_all_files_for_image(prefix)
+    except Exception:
+        app.logger.exception(f"Deleting the files under {prefix} failed")
+        return
+    for key, message in errors:
+        app.logger.error(f"Deleting {key} failed: {message}")
+
+
+def delete_blob(blob_id, content_hash):
+    delete_files(blob_prefix(content_hash) + "/")
+    with app.app_context():
+        remove_blob(blob_id)
+
+
+@lru_cache(maxsize=None)
+def example_content_hashes():
+    from app.examples import precomputed_content_hashes  # it imports this module
+
+    return precomputed_content_hashes(app.config["EXAMPLES_DIRECTORY"])
+
+
+def delete_image_and_files(image):
+    blob = image.blob
+    unique_id = image.uuid
+    db.session.delete(image)
+    unused_blob = None
+    if blob is not None and release_blob(blob):
+        # only the row goes for examples, their files are uploaded at deploy time
+        if blob.content_hash in example_content_hashes():
+            db.session.delete(blob)
+        else:  # the row stays until the files are deleted, see acquire_blob
+            blob.deleting_since = datetime.utcnow()
+            unused_blob = (blob.id, blob.content_hash)
+    db.session.commit()
+    Thread(target=delete_files, args=(unique_id,)).start()
+    if unused_blob is not None:
+        Thread(target=delete_blob, args=unused_blob).start()
+
+
+def upload_image(image_contents, full_filename, user):
+    unique_id = uuid.uuid4().hex
+    blob = acquire_blob(image_contents)
+    image = Image(
+        uuid=unique_id,
+        user=user,
+        filename=full_filename,
+        num_columns=blob.num_columns,
+        blob=blob,
+    )
+    db.session.add(image)
+    db.session.commit()
+    return unique_id
+
+
+def attach_direct_upload(image):
+    # the client put the original straight in the bucket, so process it now
+    filename, file_ending = filename_helper(image.filename)
+    image_contents = get_image_from_bucket(image.uuid, file_ending, filename)
+    if image_contents is None:
+        raise ImageNotAvailableError("The image was never uploaded.")
+    blob = acquire_blob(image_contents)
+    image.blob = blob
+    image.num_columns = blob.num_columns
+    db.session.commit()
+    Thread(
+        target=delete_image_in_bucket, args=(image.uuid, file_ending, filename)
+    ).start()
+
+
+def store_extraction(blob, number_of_columns, language, df_json, layout=None):
+    extraction = Extraction(
+        blob=blob,
+        num_columns=number_of_columns,
+        language=language,
+        tabular=df_json,
+        layout=layout,
+    )
+    db.session.add(extraction)
+    try:
+        db.session.commit()
+    except IntegrityError:  # an identical extraction finished first
+        db.session.rollback()
+
+
+def store_table_files(unique_id, full_filename, rows):
+    filename, _ = filename_helper(full_filename)
+    gather(
+        (put_excel_file_in_bucket, unique_id, table_rows_to_excel(rows), filename),
+        (put_csv_file_in_bucket, unique_id, table_rows_to_csv(rows), filename),
+    )
+
+
+def fetch_image_contents(image):
+    # Fetch image from AWS S3:
+    image_response = requests.get(image.image_url())
+    if image_response.status_code == 403:
+        raise ImageNotAvailableError(
+            "Image could not be retrieved, perhaps it had not finished uploading. Please try again."
+        )
+    if not image_response.status_code == 200:
+        raise ImageNotAvailableError(
+            "Something went wrong with getting the image from the internet."
+        )
+    return image_response.content
+
+
+def extract_table(image, number_of_columns, language):
+    extraction = None
+    if image.blob is not None:
+        extraction = image.blob.extractions.filter_by(
+            num_columns=number_of_columns, language=language
+        ).first()
+    if extraction is not None:
+        df_json = extraction.tabular
+        layout = extraction.layout
+        rows = table_rows_from_json(df_json)
+    else:
+        image_content = fetch_image_contents(image)
+        base64_encoded_image = base64.b64encode(image_content)
+        image_json = {"base64_image": base64_encoded_image, "language": language}
+        table = analyze(
+            image_json=image_json,
+            number_of_columns=number_of_columns,
+            ocr_workers=app.config["OCR_WORKERS_PER_JOB"],
+        )
+        rows = table.rows
+        df_json = table.to_json()
+        layout = table.layout_to_json()
+        if image.blob is not None:
+            store_extraction(image.blob, number_of_columns, language, df_json, layout)
+    # runs in a job worker, so the table is only done once its files are stored
+    store_table_files(image.uuid, image.filename, rows)
+    image.tabular = df_json
+    image.layout = layout
+    image.table_changed()
+    image.status = Image.DONE
+    image.error_message = None
+    db.session.add(image)
+    db.session.commit()
+    return rows
+
+
+def add_precomputed_image(precomputed, full_filename, user):
+    unique_id = uuid.uuid4().hex
+    blob = find_or_add_precomputed_blob(precomputed)
+    number_of_columns = precomputed["num_columns"]
+    language = precomputed["language"]
+    df_json = precomputed["tabular"]
+    layout = precomputed.get("layout")  # not in examples precomputed before it
+    extraction = blob.extractions.filter_by(
+        num_columns=number_of_columns, language=language
+    ).first()
+    if extraction is None:
+        store_extraction(blob, number_of_columns, language, df_json, layout)
+    if not reference_blob(blob):  # the blob was released while we looked at it
+        return add_precomputed_image(precomputed, full_filename, user)
+    image = Image(
+        uuid=unique_id,
+        user=user,
+        filename=full_filename,
+        num_columns=number_of_columns,
+        blob=blob,
+        tabular=df_json,
+        layout=layout,
+        table_version=1,
+        table_updated_at=datetime.utcnow(),
+        status=Image.DONE,
+    )
+    db.session.add(image)
+    db.session.commit()
+    rows = table_rows_from_json(df_json)
+    Thread(target=store_table_files, args=(unique_id, full_filename, rows)).start()
+    return unique_id
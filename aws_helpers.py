@@ -1,11 +1,32 @@
 import boto3
+import botocore
+import hashlib
 import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from botocore.config import Config as BotoConfig
 from dotenv import load_dotenv
 
 load_dotenv()
 AWS_SERVER_PUBLIC_KEY = os.getenv("AWS_SERVER_PUBLIC_KEY")
 AWS_SERVER_SECRET_KEY = os.getenv("AWS_SERVER_SECRET_KEY")
 AWS_BUCKET_NAME = os.getenv("AWS_BUCKET_NAME")
+# point at an S3-compatible stand-in such as MinIO or moto_server when testing
+AWS_ENDPOINT_URL = os.getenv("AWS_ENDPOINT_URL")
+PRESIGNED_URL_EXPIRATION = 3600
+MAX_UPLOAD_SIZE = 16 * 1024 * 1024  # bytes, for direct uploads to the bucket
+STORAGE_THREADS = int(os.getenv("STORAGE_THREADS") or 8)
+DELETE_BATCH_SIZE = 1000  # the most one delete_objects request takes
+IMAGE_CONTENT_TYPES = {
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+# for content-addressed objects, whose key changes whenever the bytes do
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# for the table files, which are overwritten whenever the table changes
+REVALIDATE_CACHE_CONTROL = "no-cache"
 
 
 def filename_helper(filename):
@@ -19,61 +40,121 @@ def get_bucket_name():
     return AWS_BUCKET_NAME
 
 
-def put_image_in_bucket(unique_id, image_binary_data, file_ending, filename):
+def put_image_in_bucket(
+    unique_id, image_binary_data, file_ending, filename, cache_control=None
+):
     full_filepath = make_filepath(unique_id, filename) + "." + file_ending
-    bucket_name = get_bucket_name()
-    s3 = gets3()
-    s3.Bucket(bucket_name).put_object(
+    extra_arguments = {"CacheControl": cache_control} if cache_control else {}
+    get_s3_client().put_object(
+        Bucket=get_bucket_name(),
         Key=full_filepath,
         Body=image_binary_data,
-        ContentType="image",
+        ContentType=IMAGE_CONTENT_TYPES.get(file_ending.lower(), "image"),
         ACL="public-read",
+        **extra_arguments,
     )
 
 
 def put_excel_file_in_bucket(unique_id, excel_binary_data, filename):
     full_filepath = make_filepath(unique_id, filename) + ".xlsx"
-    bucket_name = get_bucket_name()
-    s3 = gets3()
-    s3.Bucket(bucket_name).put_object(
+    get_s3_client().put_object(
+        Bucket=get_bucket_name(),
         Key=full_filepath,
         Body=excel_binary_data,
         ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        CacheControl=REVALIDATE_CACHE_CONTROL,
         ACL="public-read",
     )
 
 
 def put_csv_file_in_bucket(unique_id, csv_binary_data, filename):
     full_filepath = make_filepath(unique_id, filename) + ".csv"
-    bucket_name = get_bucket_name()
-    s3 = gets3()
-    s3.Bucket(bucket_name).put_object(
+    get_s3_client().put_object(
+        Bucket=get_bucket_name(),
         Key=full_filepath,
         Body=csv_binary_data,
         ContentType="text/csv",
+        CacheControl=REVALIDATE_CACHE_CONTROL,
         ACL="public-read",
     )
 
 
+def content_hash(binary_data):
+    return hashlib.sha256(binary_data).hexdigest()
+
+
+def blob_prefix(content_hash):
+    # content-addressed objects live apart from the per-image uuid folders
+    return f"blobs/{content_hash}"
+
+
 def make_filepath(unique_id, filename):
     full_filepath = f"{unique_id}/{filename}"
     return full_filepath
 
 
-def get_url(unique_id, filename):
+def get_bucket_url():
     bucket_name = get_bucket_name()
+    if AWS_ENDPOINT_URL:
+        return f"{AWS_ENDPOINT_URL.rstrip('/')}/{bucket_name}"
+    return f"https://{bucket_name}.s3.amazonaws.com"
+
+
+def get_url(unique_id, filename):
     full_filepath = make_filepath(unique_id, filename)
-    url = f"https://{bucket_name}.s3.amazonaws.com/{full_filepath}"
+    url = f"{get_bucket_url()}/{full_filepath}"
     return url
 
 
 def get_url_with_file_ending(unique_id, file_ending, filename):
-    bucket_name = get_bucket_name()
     full_filepath = make_filepath(unique_id, filename)
-    url = f"https://{bucket_name}.s3.amazonaws.com/{full_filepath}.{file_ending}"
+    url = f"{get_bucket_url()}/{full_filepath}.{file_ending}"
     return url
 
 
+def get_presigned_upload(unique_id, file_ending, filename, content_type):
+    # a POST policy, unlike a presigned PUT, lets S3 refuse files that are too big
+    full_filepath = make_filepath(unique_id, filename) + "." + file_ending
+    return get_s3_client().generate_presigned_post(
+        get_bucket_name(),
+        full_filepath,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, MAX_UPLOAD_SIZE],
+        ],
+        ExpiresIn=PRESIGNED_URL_EXPIRATION,
+    )
+
+
+def get_image_from_bucket(unique_id, file_ending, filename):
+    # returns None if nothing has been uploaded there
+    full_filepath = make_filepath(unique_id, filename) + "." + file_ending
+    s3_client = get_s3_client()
+    try:
+        response = s3_client.get_object(Bucket=get_bucket_name(), Key=full_filepath)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return response["Body"].read()
+
+
+def uploaded_image_size(unique_id, file_ending, filename):
+    # returns None if nothing has been uploaded there
+    full_filepath = make_filepath(unique_id, filename) + "." + file_ending
+    try:
+        response = get_s3_client().head_object(
+            Bucket=get_bucket_name(), Key=full_filepath
+        )
+    except botocore.exceptions.ClientError:
+        return None
+    return response["ContentLength"]
+
+
+def delete_image_in_bucket(unique_id, file_ending, filename):
+    full_filepath = make_filepath(unique_id, filename) + "." + file_ending
+    get_s3_client().delete_object(Bucket=get_bucket_name(), Key=full_filepath)
+
+
 def get_excel_url(unique_id, filename):
     return get_url_with_file_ending(unique_id, "xlsx", filename)
 
@@ -82,33 +163,79 @@ def get_csv_url(unique_id, filename):
     return get_url_with_file_ending(unique_id, "csv", filename)
 
 
-def delete_all_files_for_image(unique_id):
-    bucket_name = get_bucket_name()
-    s3 = gets3()
-    objects_to_delete = s3.meta.client.list_objects(
-        Bucket=bucket_name, Prefix=unique_id
-    )
-    delete_keys = {"Objects": []}
-    delete_keys["Objects"] = [
-        {"Key": k}
-        for k in [obj["Key"] for obj in objects_to_delete.get("Contents", [])]
-    ]
-    s3.meta.client.delete_objects(Bucket=bucket_name, Delete=delete_keys)
-
-
-def gets3():
-    session = boto3.Session(
-        aws_access_key_id=AWS_SERVER_PUBLIC_KEY,
-        aws_secret_access_key=AWS_SERVER_SECRET_KEY,
-    )
-    s3 = session.resource("s3")
-    return s3
+def list_objects_in_bucket(prefix=""):
+    # pages through the listing, which returns at most 1000 objects at a time
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=get_bucket_name(), Prefix=prefix):
+        yield from page.get("Contents", [])
 
 
-def delete_remote_excel(unique_id, filename):
-    bucket_name = get_bucket_name()
-    s3 = gets3()
+def delete_keys_in_bucket(keys):
+    # returns the keys that could not be deleted with their error messages
+    s3_client = get_s3_client()
+    keys = list(keys)
+    errors = []
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[start : start + DELETE_BATCH_SIZE]
+        response = s3_client.delete_objects(
+            Bucket=get_bucket_name(),
+            Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+        )
+        errors.extend(
+            (error["Key"], error["Message"]) for error in response.get("Errors", [])
+        )
+    return errors
+
+
+def delete_all_files_for_image(unique_id):
+    objects = list_objects_in_bucket(unique_id)
+    return delete_keys_in_bucket(obj["Key"] for obj in objects)
+
+
+s3_client_lock = Lock()
+s3_client = None
+s3_client_pid = None
+
+
+def get_s3_client():
+    # one client per process: clients are thread-safe, but don't survive a fork
+    global s3_client, s3_client_pid
+    with s3_client_lock:
+        if s3_client_pid != os.getpid():
+            session = boto3.Session(
+                aws_access_key_id=AWS_SERVER_PUBLIC_KEY,
+                aws_secret_access_key=AWS_SERVER_SECRET_KEY,
+            )
+            s3_client = session.client(
+                "s3",
+                endpoint_url=AWS_ENDPOINT_URL,
+                config=BotoConfig(max_pool_connections=STORAGE_THREADS),
+            )
+            s3_client_pid = os.getpid()
+        return s3_client
+
+
+storage_pool = ThreadPoolExecutor(
+    max_workers=STORAGE_THREADS, thread_name_prefix="storage"
+)
+
+
+def gather(*calls):
+    """Run (function, *args) calls at once and return their results in order.
+
+    The storage calls are network bound, so this takes as long as the slowest
+    one instead of all of them together. The first error is raised once every
+    call has finished. Don't gather calls that gather themselves.
+    """
+    futures = [storage_pool.submit(function, *args) for function, *args in calls]
+    errors = [future.exception() for future in futures]
+    for error in errors:
+        if error is not None:
+            raise error
+    return [future.result() for future in futures]
+
+
+def delete_table_files(unique_id, filename):
     filename_without_ending, _ = filename_helper(filename)
-    excel_path = make_filepath(unique_id, filename_without_ending) + ".xlsx"
-    excel_file = s3.Object(bucket_name, excel_path)
-    excel_file.delete()
+    path = make_filepath(unique_id, filename_without_ending)
+    return delete_keys_in_bucket([path + ".xlsx", path + ".csv"])
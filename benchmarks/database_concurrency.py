@@ -0,0 +1,104 @@
+"""Hammer the database with uploads from several processes at once.
+
+Every process adds images for its own user and reads the listing back, the
+way concurrent uWSGI workers do, against a fresh SQLite database in each
+journal mode. Reports throughput, the time spent waiting for commits and how
+many commits failed with "database is locked".
+
+    python benchmarks/database_concurrency.py [--processes 5] [--uploads 200]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+JOURNAL_MODES = ["DELETE", "WAL"]
+
+
+def configure(database_uri, journal_mode):
+    # runs in a fresh process, before the app reads its config
+    os.environ["DATABASE_URL"] = database_uri
+    os.environ["SQLITE_JOURNAL_MODE"] = journal_mode
+    os.environ["SQLITE_BUSY_TIMEOUT"] = "5000"
+    sys.path.insert(0, ROOT)
+
+
+def create_tables(database_uri, journal_mode):
+    configure(database_uri, journal_mode)
+    from app import db
+
+    db.create_all()
+
+
+def hammer(database_uri, journal_mode, worker, uploads, results):
+    configure(database_uri, journal_mode)
+    from sqlalchemy.exc import OperationalError
+    from app import db
+    from app.models import User, Image
+
+    user = User(username=f"user{worker}", email=f"user{worker}@example.com")
+    db.session.add(user)
+    db.session.commit()
+    commit_seconds = 0.0
+    failures = 0
+    for i in range(uploads):
+        db.session.add(Image(uuid=uuid.uuid4().hex, user=user, filename=f"{i}.png"))
+        start = time.perf_counter()
+        try:
+            db.session.commit()
+        except OperationalError:
+            db.session.rollback()
+            failures += 1
+        commit_seconds += time.perf_counter() - start
+        user.images.order_by(Image.timestamp.desc()).limit(24).all()
+    results.put((commit_seconds, failures))
+
+
+def benchmark(journal_mode, processes, uploads):
+    with tempfile.TemporaryDirectory() as directory:
+        database_uri = "sqlite:///" + os.path.join(directory, "app.db")
+        context = multiprocessing.get_context("spawn")
+        setup = context.Process(target=create_tables, args=(database_uri, journal_mode))
+        setup.start()
+        setup.join()
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=hammer,
+                args=(database_uri, journal_mode, worker, uploads, results),
+            )
+            for worker in range(processes)
+        ]
+        start = time.perf_counter()
+        for process in workers:
+            process.start()
+        outcomes = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+        elapsed = time.perf_counter() - start
+    commit_seconds = sum(seconds for seconds, _ in outcomes)
+    failures = sum(failed for _, failed in outcomes)
+    return processes * uploads / elapsed, commit_seconds, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=5)
+    parser.add_argument("--uploads", type=int, default=200)
+    args = parser.parse_args()
+    print(f"{'mode':<8} {'uploads/s':>10} {'commit wait s':>14} {'locked':>7}")
+    for journal_mode in JOURNAL_MODES:
+        throughput, commit_seconds, failures = benchmark(
+            journal_mode, args.processes, args.uploads
+        )
+        print(
+            f"{journal_mode:<8} {throughput:>10.1f} {commit_seconds:>14.2f} {failures:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
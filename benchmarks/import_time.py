@@ -0,0 +1,61 @@
+"""Report how long the command line tool and api take to import.
+
+Runs each target in a fresh interpreter with `python -X importtime` and prints
+the total import time together with the slowest modules up to two levels
+deep, so heavy imports creeping back onto the startup path show up.
+
+    python benchmarks/import_time.py [--top 10] [--max-ms 400]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+TARGETS = {
+    "api": ["-c", "import api"],
+    "command-line --help": ["command-line.py", "--help"],
+}
+
+
+def import_times(arguments):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            times.append((int(cumulative) / 1000, depth, name.strip()))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--max-ms", type=float, help="exit with an error if a target is slower"
+    )
+    args = parser.parse_args()
+    too_slow = False
+    for target, arguments in TARGETS.items():
+        times = import_times(arguments)
+        total = sum(ms for ms, depth, _ in times if depth == 0)
+        print(f"{target}: {total:.0f} ms")
+        for ms, depth, name in sorted(times, reverse=True)[: args.top]:
+            print(f"    {ms:>8.1f} ms  {'  ' * depth}{name}")
+        if args.max_ms is not None and total > args.max_ms:
+            too_slow = True
+    return 1 if too_slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
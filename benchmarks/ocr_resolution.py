@@ -0,0 +1,109 @@
+"""Compare OCR speed and cell accuracy of the fixed and adaptive resolutions.
+
+Runs every image in images/ through the upload preprocessing and analyze() in
+each resolution mode. Cell accuracy is measured against images/expected/<name>.csv
+when such a file exists, and otherwise against the table extracted from the
+image at its native resolution.
+
+    python benchmarks/ocr_resolution.py [--language English] [--repeat 3]
+"""
+import argparse
+import base64
+import csv
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import cv2  # noqa: E402
+
+from api import analyze, find_number_of_columns_in_image, preprocess_image  # noqa: E402
+
+IMAGE_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "images")
+EXPECTED_DIRECTORY = os.path.join(IMAGE_DIRECTORY, "expected")
+MODES = ["fixed", "adaptive"]
+
+
+def read_expected_rows(name):
+    path = os.path.join(EXPECTED_DIRECTORY, f"{name}.csv")
+    if not os.path.exists(path):
+        return None
+    with open(path, newline="") as f:
+        return [row for row in csv.reader(f)]
+
+
+def extract_rows(image_contents, number_of_columns, language):
+    image_json = {
+        "base64_image": base64.b64encode(image_contents),
+        "language": language,
+    }
+    return analyze(image_json=image_json, number_of_columns=number_of_columns).rows
+
+
+def cell_accuracy(rows, expected_rows):
+    total = sum(len(row) for row in expected_rows)
+    if total == 0:
+        return 1.0
+    correct = 0
+    for row, expected_row in zip(rows, expected_rows):
+        for cell, expected_cell in zip(row, expected_row):
+            correct += cell.strip() == expected_cell.strip()
+    return correct / total
+
+
+def benchmark_image(path, language, repeat):
+    name, _ = os.path.splitext(os.path.basename(path))
+    with open(path, "rb") as f:
+        original_contents = f.read()
+    original_image = cv2.imread(path)
+    number_of_columns = find_number_of_columns_in_image(original_image)
+    expected_rows = read_expected_rows(name)
+    reference = "expected"
+    if expected_rows is None:
+        expected_rows = extract_rows(original_contents, number_of_columns, language)
+        reference = "native"
+    results = []
+    for mode in MODES:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            preprocessed = preprocess_image(original_contents, resolution=mode)
+            rows = extract_rows(
+                preprocessed["image_contents"], number_of_columns, language
+            )
+            timings.append(time.perf_counter() - start)
+        height, width = preprocessed["image"].shape[:2]
+        results.append(
+            (
+                name,
+                mode,
+                f"{width}x{height}",
+                min(timings),
+                cell_accuracy(rows, expected_rows),
+                reference,
+            )
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--language", default="English")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(f"{'image':<16} {'mode':<9} {'size':>10} {'seconds':>8} {'cells':>6}  vs")
+    for filename in sorted(os.listdir(IMAGE_DIRECTORY)):
+        path = os.path.join(IMAGE_DIRECTORY, filename)
+        if not os.path.isfile(path):
+            continue
+        for name, mode, size, seconds, accuracy, reference in benchmark_image(
+            path, args.language, args.repeat
+        ):
+            print(
+                f"{name:<16} {mode:<9} {size:>10} {seconds:>8.3f} {accuracy:>6.1%}  {reference}"
+            )
+
+
+if __name__ == "__main__":
+    main()
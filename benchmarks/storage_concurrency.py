@@ -0,0 +1,66 @@
+"""Compare storing an upload's objects one by one with storing them at once.
+
+Puts the objects an upload and its extraction write (the preprocessed image,
+the thumbnails and the Excel and CSV files) in the configured bucket, first
+one after the other and then gathered on the storage pool, and deletes them
+again. Point AWS_ENDPOINT_URL at a local S3 stand-in to try it without AWS.
+
+    python benchmarks/storage_concurrency.py [--rounds 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import aws_helpers  # noqa: E402
+
+OBJECTS = {  # filename and ending: size in bytes
+    ("image", "png"): 200_000,
+    ("image_thumbnail_400", "webp"): 10_000,
+    ("image_thumbnail_400", "jpg"): 20_000,
+    ("image_thumbnail_800", "webp"): 30_000,
+    ("image_thumbnail_800", "jpg"): 60_000,
+    ("image_detail", "webp"): 80_000,
+    ("table", "xlsx"): 8_000,
+    ("table", "csv"): 2_000,
+}
+
+
+def puts(prefix):
+    return [
+        (aws_helpers.put_image_in_bucket, prefix, os.urandom(size), ending, name)
+        for (name, ending), size in OBJECTS.items()
+    ]
+
+
+def sequential(prefix):
+    for function, *args in puts(prefix):
+        function(*args)
+
+
+def gathered(prefix):
+    aws_helpers.gather(*puts(prefix))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    aws_helpers.get_s3_client()  # don't count creating the client
+    for store in [sequential, gathered]:
+        seconds = []
+        for _ in range(args.rounds):
+            prefix = f"benchmark-{uuid.uuid4().hex}"
+            start = time.perf_counter()
+            store(prefix)
+            seconds.append(time.perf_counter() - start)
+            aws_helpers.delete_all_files_for_image(prefix)
+        print(f"{store.__name__:<11} {1000 * min(seconds):>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Compare worker memory and first request latency with and without the warmup.
+
+Starts uWSGI with the plain wsgi:app module and with warmup:app, then reports
+the unique (USS) and proportional (PSS) memory of every worker and how long
+the first request to a fresh single worker takes. Needs uwsgi on the PATH and
+Linux /proc.
+
+    python benchmarks/worker_memory.py [--processes 5] [--repeat 3]
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+MODULES = ["wsgi:app", "warmup:app"]
+PORT = 9123
+URL = f"http://127.0.0.1:{PORT}/login"
+
+
+def start_uwsgi(module, processes):
+    return subprocess.Popen(
+        [
+            "uwsgi",
+            "--module",
+            module,
+            "--master",
+            "--processes",
+            str(processes),
+            "--http-socket",
+            f"127.0.0.1:{PORT}",
+            "--die-on-term",
+        ],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def stop_uwsgi(process):
+    process.send_signal(signal.SIGTERM)
+    process.wait()
+
+
+def worker_pids(master_pid):
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def wait_for_workers(master_pid, processes, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if len(worker_pids(master_pid)) == processes:
+            return
+        time.sleep(0.1)
+    raise RuntimeError("uWSGI did not start its workers")
+
+
+def wait_until_listening(timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            return urllib.request.urlopen(URL)
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("uWSGI is not answering requests")
+
+
+def memory_in_mb(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Pss:", "Private_Clean:", "Private_Dirty:"):
+                values[parts[0]] = int(parts[1]) / 1024
+    uss = values["Private_Clean:"] + values["Private_Dirty:"]
+    return uss, values["Pss:"]
+
+
+def measure_memory(module, processes):
+    process = start_uwsgi(module, processes)
+    try:
+        wait_for_workers(process.pid, processes)
+        wait_until_listening()
+        for _ in range(processes * 2):  # let every worker serve something
+            urllib.request.urlopen(URL).read()
+        return [memory_in_mb(pid) for pid in worker_pids(process.pid)]
+    finally:
+        stop_uwsgi(process)
+
+
+def measure_first_request(module):
+    process = start_uwsgi(module, 1)
+    try:
+        wait_for_workers(process.pid, 1)
+        # the first answer only tells us the socket is up, so restart the worker
+        wait_until_listening().read()
+        worker = worker_pids(process.pid)[0]
+        os.kill(worker, signal.SIGKILL)
+        while worker_pids(process.pid) in ([], [worker]):
+            time.sleep(0.01)
+        start = time.perf_counter()
+        wait_until_listening().read()
+        return time.perf_counter() - start
+    finally:
+        stop_uwsgi(process)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(f"{'module':<12} {'USS MB':>8} {'PSS MB':>8} {'first request s':>16}")
+    for module in MODULES:
+        workers = measure_memory(module, args.processes)
+        uss = sum(u for u, _ in workers) / len(workers)
+        pss = sum(p for _, p in workers) / len(workers)
+        first = min(measure_first_request(module) for _ in range(args.repeat))
+        print(f"{module:<12} {uss:>8.1f} {pss:>8.1f} {first:>16.3f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
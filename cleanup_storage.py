@@ -0,0 +1,100 @@
+import argparse
+import re
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from app import app, db
+from app.models import Image, Blob
+from app.examples import precomputed_content_hashes
+from aws_helpers import list_objects_in_bucket, delete_keys_in_bucket, DELETE_BATCH_SIZE
+
+IMAGE_PREFIX = re.compile(r"[0-9a-f]{32}")
+BLOB_PREFIX = re.compile(r"[0-9a-f]{64}")
+QUERY_BATCH_SIZE = 10000
+EXAMPLE_KEYS = 10
+
+parser = argparse.ArgumentParser(
+    description="Find objects in the bucket that no image or blob refers to "
+    "and delete them. Without --delete only reports what it would delete.",
+    prog=sys.argv[0],
+)
+parser.add_argument(
+    "--delete", action="store_true", help="delete the orphans instead of listing them"
+)
+parser.add_argument(
+    "--min-age",
+    type=float,
+    default=24,
+    help="hours an object must be old, so uploads in progress are left alone",
+)
+
+
+def known_prefixes():
+    # plain sets: a uuid and a hash are about 100 bytes each, so a million
+    # images fit in a few hundred MB and nothing is kept by a false positive
+    uuids = {
+        uuid for (uuid,) in db.session.query(Image.uuid).yield_per(QUERY_BATCH_SIZE)
+    }
+    # the files of blobs being deleted are going anyway
+    kept_blobs = db.session.query(Blob.content_hash).filter(
+        Blob.deleting_since.is_(None)
+    )
+    content_hashes = {
+        content_hash for (content_hash,) in kept_blobs.yield_per(QUERY_BATCH_SIZE)
+    }
+    # examples are stored when precomputed, their blob row when first added
+    content_hashes.update(precomputed_content_hashes(app.config["EXAMPLES_DIRECTORY"]))
+    return uuids, content_hashes
+
+
+def kind_of_orphan(key, uuids, content_hashes):
+    # None unless the key has a layout we write and nothing refers to it
+    parts = key.split("/")
+    if len(parts) == 3 and parts[0] == "blobs" and BLOB_PREFIX.fullmatch(parts[1]):
+        return None if parts[1] in content_hashes else "blob"
+    if len(parts) == 2 and IMAGE_PREFIX.fullmatch(parts[0]):
+        return None if parts[0] in uuids else "image"
+    return None
+
+
+def main():
+    args = parser.parse_args()
+    with app.app_context():
+        uuids, content_hashes = known_prefixes()
+    created_before = datetime.now(timezone.utc) - timedelta(hours=args.min_age)
+    counts = Counter()
+    sizes = Counter()
+    batch = []
+    failed = []
+    for obj in list_objects_in_bucket():
+        counts["objects"] += 1
+        kind = kind_of_orphan(obj["Key"], uuids, content_hashes)
+        if kind is None:
+            continue
+        if obj["LastModified"] > created_before:
+            counts["too new"] += 1
+            continue
+        counts[kind] += 1
+        sizes[kind] += obj["Size"]
+        if counts[kind] <= EXAMPLE_KEYS:
+            print(f"orphaned {kind} file {obj['Key']}")
+        if args.delete:
+            batch.append(obj["Key"])
+            if len(batch) == DELETE_BATCH_SIZE:
+                failed.extend(delete_keys_in_bucket(batch))
+                batch = []
+    if batch:
+        failed.extend(delete_keys_in_bucket(batch))
+    for key, message in failed:
+        print(f"could not delete {key}: {message}")
+    action = "Deleted" if args.delete else "Would delete"
+    print(f"Looked at {counts['objects']} objects.")
+    for kind in ["image", "blob"]:
+        megabytes = sizes[kind] / 1e6
+        print(f"{action} {counts[kind]} orphaned {kind} files ({megabytes:.1f} MB).")
+    print(f"Left {counts['too new']} orphans younger than {args.min_age} hours.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,26 +1,8 @@
 import argparse
 import sys
-import pandas as pd
 import base64
-import cv2
-import numpy as np
-from api import (
-    analyze,
-    image_to_base64_json,
-    write_to_files,
-    find_number_of_columns,
-    resize_json_wrapper,
-)
-
-try:
-    from PIL import Image
-except ImportError:
-    import Image
-
-parser = argparse.ArgumentParser(
-    description="Extract tabular data from an image using Tesseract OCR.",
-    prog=sys.argv[0],
-)
+
+# api pulls in OpenCV and numpy, so it is imported once the arguments are parsed
 
 
 def column_widths(table):
@@ -98,6 +80,9 @@ def pretty_print_table(table, alignment_list=None):
 
 
 def show_image(image_json):
+    import cv2
+    import numpy as np
+
     base64_encoded_image = image_json.get("base64_image")
     image_string = base64.b64decode(base64_encoded_image)
     image_as_byte_array = np.frombuffer(image_string, np.uint8)
@@ -119,29 +104,62 @@ def positive_integer(n):
         raise argparse.ArgumentTypeError(message)
 
 
-parser.add_argument("filepath", type=str, help="path to image file")
-parser.add_argument("--show", action="store_true", help="show all bounding boxes")
-args = parser.parse_args()
-
-image_json = image_to_base64_json(args.filepath)
-image_json = resize_json_wrapper(image_json)
-guessed_number_of_columns = find_number_of_columns(image_json, show=args.show)
-print(guessed_number_of_columns)
-print("Columns")
-language = "English"
-image_json["language"] = language
-analyzed_results = analyze(
-    image_json=image_json, number_of_columns=guessed_number_of_columns
-)
-df_json = analyzed_results["df"]
-# alignment_list = analyzed_results["alignment_list"]
-df = pd.read_json(df_json, orient="split")
-rows = df.values.tolist()
-print(rows)
-
-print("Printing table.")
-print()
-pretty_print_table(rows)  # , alignment_list)
-print()
-# write_to_files(df_json, args.filepath)
-show_image(image_json)
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Extract tabular data from an image using Tesseract OCR.",
+        prog=sys.argv[0],
+    )
+    parser.add_argument("filepath", type=str, help="path to image file")
+    parser.add_argument("--show", action="store_true", help="show all bounding boxes")
+    parser.add_argument(
+        "--columns",
+        type=positive_integer,
+        help="number of columns, guessed from the image if not given",
+    )
+    parser.add_argument("--language", default="English", help="language of the text")
+    parser.add_argument(
+        "--write", action="store_true", help="write the table to csv and excel files"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    from api import (
+        analyze,
+        image_to_base64_json,
+        preprocess_image,
+        write_to_files,
+        find_number_of_columns_in_image,
+    )
+
+    image_contents = base64.b64decode(
+        image_to_base64_json(args.filepath)["base64_image"]
+    )
+    preprocessed = preprocess_image(image_contents)
+    image_json = {
+        "base64_image": base64.b64encode(preprocessed["image_contents"]),
+        "language": args.language,
+    }
+    number_of_columns = args.columns
+    if number_of_columns is None:
+        number_of_columns = find_number_of_columns_in_image(
+            preprocessed["image"], show=args.show, otsu=preprocessed["otsu"]
+        )
+        print(number_of_columns)
+        print("Columns")
+    table = analyze(image_json=image_json, number_of_columns=number_of_columns)
+    print(table.rows)
+
+    print("Printing table.")
+    print()
+    pretty_print_table(table.rows)
+    print()
+    if args.write:
+        write_to_files(table, args.filepath)
+    if args.show:
+        show_image(image_json)
+
+
+if __name__ == "__main__":
+    main()
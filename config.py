@@ -5,12 +5,27 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 load_dotenv()
 
 
+def engine_options(database_uri):
+    if database_uri.startswith("sqlite"):
+        # pragmas are set per connection by the listener in app/__init__.py
+        return {}
+    return {
+        "pool_size": int(os.environ.get("DATABASE_POOL_SIZE") or 5),
+        "max_overflow": int(os.environ.get("DATABASE_MAX_OVERFLOW") or 10),
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    }
+
+
 class Config(object):
     SECRET_KEY = os.environ.get("SECRET_KEY") or "you-will-never-guess"
     SQLALCHEMY_DATABASE_URI = os.environ.get(
         "DATABASE_URL"
     ) or "sqlite:///" + os.path.join(basedir, "app.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE") or "WAL"
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT") or 30000)  # ms
     MAIL_SERVER = os.environ.get("MAIL_SERVER")
     MAIL_PORT = int(os.environ.get("MAIL_PORT") or 25)
     MAIL_USE_TLS = os.environ.get("MAIL_USE_TLS") is not None
@@ -19,3 +34,25 @@ class Config(object):
     ADMINS = ["vegard.stikbakke@gmail.com"]
     UPLOADED_PHOTOS_DEST = os.getcwd()
     APPNAME = "Image-to-Table"
+    IMAGES_PER_PAGE = 24
+    # extraction jobs, run by worker.py and by JOB_WORKER_THREADS in each web worker
+    JOB_WORKER_THREADS = int(os.environ.get("JOB_WORKER_THREADS") or 1)
+    JOB_POLL_INTERVAL = 1  # seconds
+    JOB_HEARTBEAT_INTERVAL = 10
+    JOB_VISIBILITY_TIMEOUT = 120  # a running job without heartbeats is retried
+    JOB_MAX_ATTEMPTS = 3
+    JOB_RETRY_DELAY = 5  # doubled for every failed attempt
+    JOB_FAIRNESS_WINDOW = 3600  # users served longer ago count as never served
+    JOB_RETENTION = 86400  # finished jobs are deleted after this many seconds
+    JOB_PRUNE_INTERVAL = 600
+    OCR_SLOTS = int(os.environ.get("OCR_SLOTS") or os.cpu_count() or 1)  # per host
+    # Tesseract processes per page for the cell and column re-reads; at least
+    # two, as those crops are small and a core each would read them one by one
+    OCR_WORKERS_PER_JOB = max(2, (os.cpu_count() or 1) // OCR_SLOTS)
+    MAX_RUNNING_JOBS_PER_USER = 2
+    MAX_PENDING_JOBS_PER_USER = 20
+    MAX_QUEUED_JOBS = 200
+    ESTIMATED_JOB_SECONDS = 10  # for Retry-After
+    BLOB_DELETE_TIMEOUT = 60  # a blob deleting for longer lost its worker
+    THUMBNAIL_THREADS = int(os.environ.get("THUMBNAIL_THREADS") or 2)
+    EXAMPLES_DIRECTORY = os.path.join(basedir, "examples")
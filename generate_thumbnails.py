@@ -0,0 +1,45 @@
+import argparse
+import io
+import sys
+from PIL import Image as PILImage
+from app import app, db
+from app.models import Blob
+from app.uploads import put_blob_thumbnails
+from aws_helpers import get_image_from_bucket, delete_image_in_bucket, blob_prefix
+
+parser = argparse.ArgumentParser(
+    description="Make the WebP and JPEG thumbnails of blobs stored before them.",
+    prog=sys.argv[0],
+)
+parser.add_argument(
+    "--keep-old",
+    action="store_true",
+    help="keep the single PNG thumbnail the blobs had before",
+)
+
+
+def main():
+    args = parser.parse_args()
+    with app.app_context():
+        for blob in Blob.query.filter_by(
+            thumbnails_ready=False, deleting_since=None
+        ).all():
+            prefix = blob_prefix(blob.content_hash)
+            image_contents = get_image_from_bucket(
+                prefix, blob.file_ending, Blob.IMAGE_NAME
+            )
+            if image_contents is None:
+                print(f"{blob.content_hash} has no image, skipping it.")
+                continue
+            print(f"Making thumbnails for {blob.content_hash}.")
+            pil_image = PILImage.open(io.BytesIO(image_contents))
+            put_blob_thumbnails(blob.content_hash, pil_image)
+            blob.width, blob.height = pil_image.size
+            blob.thumbnails_ready = True
+            db.session.commit()
+            if not args.keep_old:
+                delete_image_in_bucket(prefix, blob.file_ending, Blob.THUMBNAIL_NAME)
+
+
+if __name__ == "__main__":
+    main()
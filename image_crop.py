@@ -1,6 +1,9 @@
 from PIL import Image
 import io
 
+THUMBNAIL_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+THUMBNAIL_QUALITY = 80
+
 
 def square_image_no_fill(image):
     width = float(image.width)
@@ -17,12 +20,29 @@ def square_image_no_fill(image):
     return image
 
 
-def thumbnail(image_data, N=800):
-    image = Image.open(io.BytesIO(image_data))
-    squared_image = square_image_no_fill(image)
-    size = N, N
-    squared_image.thumbnail(size, Image.ANTIALIAS)
+def thumbnail_fits(width, height, size):
+    # PIL doesn't scale up, so a larger size would only copy a smaller one
+    thumbnail_width, square, _ = size
+    return thumbnail_width <= (min(width, height) if square else width)
+
+
+def encode_thumbnail(image, file_ending):
     with io.BytesIO() as output:
-        squared_image.save(output, format="PNG")
-        image_contents = output.getvalue()
-    return image_contents
+        image.save(
+            output, format=THUMBNAIL_FORMATS[file_ending], quality=THUMBNAIL_QUALITY
+        )
+        return output.getvalue()
+
+
+def thumbnails_from_image(image, sizes):
+    """Encode image at every size, in the formats given for it.
+
+    sizes maps a name to (width, square, file_endings); square thumbnails are
+    cropped to the top left square. Yields (name, file_ending, contents).
+    """
+    for name, (width, square, file_endings) in sizes.items():
+        resized = square_image_no_fill(image) if square else image
+        resized = resized.convert("RGB")  # a copy, JPEG has no alpha channel
+        resized.thumbnail((width, resized.height), Image.LANCZOS)
+        for file_ending in file_endings:
+            yield name, file_ending, encode_thumbnail(resized, file_ending)
@@ -0,0 +1,28 @@
+"""job dedup key
+
+Revision ID: 0a4c8d6e2f15
+Revises: 7e3b0c95a1f8
+Create Date: 2026-10-19 19:32:40.081523
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a4c8d6e2f15'
+down_revision = '7e3b0c95a1f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.add_column(sa.Column('dedup_key', sa.String(length=120), nullable=True))
+        batch_op.create_index(batch_op.f('ix_job_dedup_key'), ['dedup_key'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_job_dedup_key'))
+        batch_op.drop_column('dedup_key')
@@ -0,0 +1,52 @@
+"""content addressed blobs and extractions
+
+Revision ID: 3f5c2a9d7b1e
+Revises: ba918e126ae1
+Create Date: 2026-10-19 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f5c2a9d7b1e'
+down_revision = 'ba918e126ae1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('blob',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('file_ending', sa.String(length=10), nullable=False),
+    sa.Column('reference_count', sa.Integer(), nullable=False),
+    sa.Column('num_columns', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_blob_content_hash'), 'blob', ['content_hash'], unique=True)
+    op.create_table('extraction',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('blob_id', sa.Integer(), nullable=False),
+    sa.Column('num_columns', sa.Integer(), nullable=False),
+    sa.Column('language', sa.String(length=32), nullable=False),
+    sa.Column('tabular', sa.String(length=10000), nullable=False),
+    sa.ForeignKeyConstraint(['blob_id'], ['blob.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('blob_id', 'num_columns', 'language')
+    )
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.add_column(sa.Column('blob_id', sa.Integer(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_image_blob_id'), ['blob_id'], unique=False)
+        batch_op.create_foreign_key('fk_image_blob_id_blob', 'blob', ['blob_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.drop_constraint('fk_image_blob_id_blob', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_image_blob_id'))
+        batch_op.drop_column('blob_id')
+    op.drop_table('extraction')
+    op.drop_index(op.f('ix_blob_content_hash'), table_name='blob')
+    op.drop_table('blob')
@@ -0,0 +1,32 @@
+"""table layout
+
+Revision ID: 4d7f1b2e8c63
+Revises: 0a4c8d6e2f15
+Create Date: 2026-10-19 21:04:12.518274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d7f1b2e8c63'
+down_revision = '0a4c8d6e2f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('extraction') as batch_op:
+        batch_op.add_column(sa.Column('layout', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.add_column(sa.Column('layout', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.drop_column('layout')
+
+    with op.batch_alter_table('extraction') as batch_op:
+        batch_op.drop_column('layout')
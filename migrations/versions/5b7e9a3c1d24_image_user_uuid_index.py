@@ -0,0 +1,26 @@
+"""image user and uuid index
+
+Revision ID: 5b7e9a3c1d24
+Revises: 8c1d4e2f6a90
+Create Date: 2026-10-19 14:26:03.118274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e9a3c1d24'
+down_revision = '8c1d4e2f6a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.create_index('ix_image_user_id_uuid', ['user_id', 'uuid'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.drop_index('ix_image_user_id_uuid')
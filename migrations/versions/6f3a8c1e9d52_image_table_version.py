@@ -0,0 +1,28 @@
+"""image table version
+
+Revision ID: 6f3a8c1e9d52
+Revises: 9b2e5d7a4f10
+Create Date: 2026-10-19 23:02:31.640518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6f3a8c1e9d52'
+down_revision = '9b2e5d7a4f10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.add_column(sa.Column('table_version', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('table_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.drop_column('table_updated_at')
+        batch_op.drop_column('table_version')
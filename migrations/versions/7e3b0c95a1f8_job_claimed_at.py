@@ -0,0 +1,26 @@
+"""job claimed at
+
+Revision ID: 7e3b0c95a1f8
+Revises: d2a6f81c4b37
+Create Date: 2026-10-19 18:05:12.664810
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e3b0c95a1f8'
+down_revision = 'd2a6f81c4b37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_column('claimed_at')
@@ -0,0 +1,36 @@
+"""api tokens and image status
+
+Revision ID: 8c1d4e2f6a90
+Revises: 3f5c2a9d7b1e
+Create Date: 2026-10-19 11:02:17.542918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1d4e2f6a90'
+down_revision = '3f5c2a9d7b1e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.add_column(sa.Column('token', sa.String(length=32), nullable=True))
+        batch_op.add_column(sa.Column('token_expiration', sa.DateTime(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_user_token'), ['token'], unique=True)
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=16), nullable=True))
+        batch_op.add_column(sa.Column('error_message', sa.String(length=140), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('image') as batch_op:
+        batch_op.drop_column('error_message')
+        batch_op.drop_column('status')
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_token'))
+        batch_op.drop_column('token_expiration')
+        batch_op.drop_column('token')
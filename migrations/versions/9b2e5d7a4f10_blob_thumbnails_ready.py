@@ -0,0 +1,26 @@
+"""blob thumbnails ready
+
+Revision ID: 9b2e5d7a4f10
+Revises: 4d7f1b2e8c63
+Create Date: 2026-10-19 22:15:47.903126
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2e5d7a4f10'
+down_revision = '4d7f1b2e8c63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blob') as batch_op:
+        batch_op.add_column(sa.Column('thumbnails_ready', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('blob') as batch_op:
+        batch_op.drop_column('thumbnails_ready')
@@ -0,0 +1,28 @@
+"""job status index
+
+Revision ID: a3d9c5e7b1f4
+Revises: e1f7b3c9a5d2
+Create Date: 2026-10-20 15:27:44.560831
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d9c5e7b1f4'
+down_revision = 'e1f7b3c9a5d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.create_index('ix_job_status_available_at', ['status', 'available_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_job_claimed_at'), ['claimed_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_index(batch_op.f('ix_job_claimed_at'))
+        batch_op.drop_index('ix_job_status_available_at')
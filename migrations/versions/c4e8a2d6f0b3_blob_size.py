@@ -0,0 +1,28 @@
+"""blob size
+
+Revision ID: c4e8a2d6f0b3
+Revises: 6f3a8c1e9d52
+Create Date: 2026-10-20 10:41:12.382950
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e8a2d6f0b3'
+down_revision = '6f3a8c1e9d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blob') as batch_op:
+        batch_op.add_column(sa.Column('width', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('height', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('blob') as batch_op:
+        batch_op.drop_column('height')
+        batch_op.drop_column('width')
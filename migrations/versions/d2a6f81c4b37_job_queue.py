@@ -0,0 +1,43 @@
+"""job queue
+
+Revision ID: d2a6f81c4b37
+Revises: 5b7e9a3c1d24
+Create Date: 2026-10-19 16:48:51.207336
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6f81c4b37'
+down_revision = '5b7e9a3c1d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('image_id', sa.Integer(), nullable=True),
+    sa.Column('num_columns', sa.Integer(), nullable=True),
+    sa.Column('language', sa.String(length=32), nullable=True),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('available_at', sa.DateTime(), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+    sa.Column('worker', sa.String(length=64), nullable=True),
+    sa.Column('error_message', sa.String(length=140), nullable=True),
+    sa.ForeignKeyConstraint(['image_id'], ['image.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_job_available_at'), 'job', ['available_at'], unique=False)
+    op.create_index(op.f('ix_job_image_id'), 'job', ['image_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_job_image_id'), table_name='job')
+    op.drop_index(op.f('ix_job_available_at'), table_name='job')
+    op.drop_table('job')
@@ -0,0 +1,26 @@
+"""job host
+
+Revision ID: e1f7b3c9a5d2
+Revises: c4e8a2d6f0b3
+Create Date: 2026-10-20 14:05:38.117204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f7b3c9a5d2'
+down_revision = 'c4e8a2d6f0b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.add_column(sa.Column('host', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('job') as batch_op:
+        batch_op.drop_column('host')
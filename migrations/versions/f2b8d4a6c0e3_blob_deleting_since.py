@@ -0,0 +1,26 @@
+"""blob deleting since
+
+Revision ID: f2b8d4a6c0e3
+Revises: a3d9c5e7b1f4
+Create Date: 2026-10-20 17:08:51.204716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d4a6c0e3'
+down_revision = 'a3d9c5e7b1f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('blob') as batch_op:
+        batch_op.add_column(sa.Column('deleting_since', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('blob') as batch_op:
+        batch_op.drop_column('deleting_since')
@@ -0,0 +1,50 @@
+import argparse
+import sys
+from app import app
+from app.examples import (
+    load_examples,
+    load_precomputed,
+    write_precomputed,
+    read_example_contents,
+    download_example,
+    precompute_example,
+)
+
+parser = argparse.ArgumentParser(
+    description="Precompute thumbnails and tables for the example images.",
+    prog=sys.argv[0],
+)
+parser.add_argument(
+    "--download",
+    action="store_true",
+    help="download example images missing from the examples directory",
+)
+parser.add_argument(
+    "--force", action="store_true", help="recompute examples already precomputed"
+)
+
+
+def main():
+    args = parser.parse_args()
+    directory = app.config["EXAMPLES_DIRECTORY"]
+    examples = load_examples(directory)
+    precomputed = load_precomputed(directory)
+    with app.app_context():
+        for example in examples:
+            filename = example["filename"]
+            if filename in precomputed and not args.force:
+                print(f"{filename} is already precomputed.")
+                continue
+            if read_example_contents(example, directory) is None:
+                if not args.download:
+                    print(f"{filename} is missing, skipping it (see --download).")
+                    continue
+                print(f"Downloading {filename}.")
+                download_example(example, directory)
+            print(f"Precomputing {filename}.")
+            precomputed[filename] = precompute_example(example, directory)
+    write_precomputed(directory, precomputed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,34 @@
 import re
 
+DIGIT_PATTERN = re.compile(r"\d")
+NUMERICAL_REPLACEMENTS = {"—": "-", ",": ".", "|": "", " ": ""}
+NUMERICAL_PATTERN = re.compile("|".join(map(re.escape, NUMERICAL_REPLACEMENTS)))
+
 
 def is_numerical(cell):
     N = len(cell)
-    digits = "\d"
-    N_numerical = len(re.findall(digits, cell))
+    N_numerical = len(DIGIT_PATTERN.findall(cell))
     percentage_numerical = N_numerical / N
     return percentage_numerical > 0.5
 
 
-def make_cell_numerical(cell, full_dictionary):
-    regex_replace = dict((re.escape(k), v) for k, v in full_dictionary.items())
-    pattern = re.compile("|".join(regex_replace.keys()))
-    cleaned_cell = pattern.sub(lambda m: regex_replace[re.escape(m.group(0))], cell)
-    return cleaned_cell
+def make_cell_numerical(cell):
+    return NUMERICAL_PATTERN.sub(lambda m: NUMERICAL_REPLACEMENTS[m.group(0)], cell)
+
+
+WHITELISTED_NUMERICAL_TRANSLATION = str.maketrans({",": ".", " ": None})
+
+
+def clean_whitelisted_numerical_cell(cell):
+    # cells read with a numeric whitelist only need the decimal mark and spaces fixed
+    return cell.translate(WHITELISTED_NUMERICAL_TRANSLATION)
 
 
 def sanitize(items):
-    characters_to_remove = ["|", " "]
-    remove_dictionary = {character: "" for character in characters_to_remove}
-    replacement_dictionary = {"—": "-", ",": "."}
-    full_dictionary = {**replacement_dictionary, **remove_dictionary}
     new_items = []
     for cell in items:
         if len(cell) > 0 and is_numerical(cell):
-            new_items.append(make_cell_numerical(cell, full_dictionary))
+            new_items.append(make_cell_numerical(cell))
         else:
             new_items.append(cell)
     return new_items
@@ -0,0 +1,68 @@
+import base64
+import os
+import sys
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# the app reads its config when it is first imported
+DATABASE = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["DATABASE_URL"] = "sqlite:///" + DATABASE.name
+os.environ.setdefault("AWS_BUCKET_NAME", "test-bucket")
+os.environ["JOB_WORKER_THREADS"] = "0"
+
+
+@pytest.fixture
+def flask_app():
+    from app import app, db
+
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+@pytest.fixture
+def user(flask_app, client):
+    from app import db
+    from app.models import User
+
+    user = User(username="susan", email="susan@example.com")
+    user.set_password("cat")
+    db.session.add(user)
+    db.session.commit()
+    client.post("/login", data={"username": "susan", "password": "cat"})
+    return user
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    import boto3
+    import aws_helpers
+    from moto import mock_aws
+
+    for name in ["AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"]:
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        monkeypatch.setattr(aws_helpers, "s3_client_pid", None)  # a mocked client
+        boto3.client("s3").create_bucket(Bucket=aws_helpers.get_bucket_name())
+        yield aws_helpers.get_bucket_name()
+    aws_helpers.s3_client_pid = None
+
+
+@pytest.fixture
+def token(client, user):
+    response = client.post(
+        "/api/tokens",
+        headers={"Authorization": "Basic " + base64.b64encode(b"susan:cat").decode()},
+    )
+    return response.get_json()["token"]
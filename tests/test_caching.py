@@ -0,0 +1,14 @@
+from flask import session
+from app.caching import page_etag
+
+
+def test_page_etag_changes_with_the_csrf_secret(flask_app):
+    etags = []
+    for secret in ["first", "second"]:
+        with flask_app.test_request_context("/images/abc"):
+            session["csrf_token"] = secret
+            etags.append(page_etag(1, "abc"))
+    with flask_app.test_request_context("/images/abc"):
+        session["csrf_token"] = "first"
+        assert page_etag(1, "abc") == etags[0]
+    assert etags[0] != etags[1]
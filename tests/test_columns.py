@@ -0,0 +1,63 @@
+import numpy as np
+import api
+from app.routes import parse_dividing_points
+
+WIDTH, HEIGHT = 600, 200
+WORDS = [  # left, top, width, height, text
+    (10, 20, 60, 20, "Apples"),
+    (400, 20, 30, 20, "12"),
+    (10, 80, 60, 20, "Pears"),
+    (400, 80, 30, 20, "7"),
+]
+
+
+def tesseract_data(image_json, ocr_workers):
+    data = {key: [] for key in ["level", "left", "top", "width", "height", "conf"]}
+    data["text"] = []
+
+    def add(level, left, top, width, height, text):
+        for key, value in zip(
+            ["level", "left", "top", "width", "height", "conf", "text"],
+            [level, left, top, width, height, 90, text],
+        ):
+            data[key].append(value)
+
+    for top in [20, 80]:
+        add(api.LINE_LEVEL, 10, top, 420, 20, "")
+    for word in WORDS:
+        add(api.WORD_LEVEL, *word)
+    data["shape"] = (WIDTH, HEIGHT)  # what PIL's Image.size gives
+    data["otsu"] = np.full((HEIGHT, WIDTH), 255, dtype=np.uint8)
+    data["language"] = "English"
+    return data
+
+
+def analyze(monkeypatch):
+    monkeypatch.setattr(api, "tesseract_specific_code", tesseract_data)
+    return api.analyze(
+        {}, number_of_columns=2, reocr_threshold=None, numeric_columns=False
+    )
+
+
+def test_layout_width_is_the_image_width(monkeypatch):
+    table = analyze(monkeypatch)
+    assert table.rows == [["Apples", "12"], ["Pears", "7"]]
+    assert table.layout["width"] == WIDTH
+    assert 70 <= table.layout["dividing_points"][0] < 400
+
+
+def test_boundaries_past_the_image_height_are_accepted(monkeypatch):
+    layout = analyze(monkeypatch).layout
+    assert parse_dividing_points({"dividing_points": [450]}, layout) == [450]
+    assert parse_dividing_points({"dividing_points": [WIDTH]}, layout) is None
+    assert parse_dividing_points({"dividing_points": [0]}, layout) is None
+    assert parse_dividing_points({"dividing_points": [1, 2]}, layout) is None
+
+
+def test_moving_a_boundary_changes_only_the_affected_cells(monkeypatch):
+    table = analyze(monkeypatch)
+    changed = api.move_dividing_points(table.rows, table.layout, [450])
+    assert table.rows == [["Apples 12", ""], ["Pears 7", ""]]
+    assert changed == [(0, 0, "Apples 12"), (0, 1, ""), (1, 0, "Pears 7"), (1, 1, "")]
+    assert table.layout["dividing_points"] == [450]
+    assert api.move_dividing_points(table.rows, table.layout, [450]) == []
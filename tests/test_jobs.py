@@ -0,0 +1,130 @@
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+import pytest
+import app.jobs as jobs
+import app.scheduler as scheduler
+import app.uploads as uploads
+from app import db
+from app.models import Image, Job, User
+from aws_helpers import put_image_in_bucket
+
+IMAGE = os.path.join(os.path.dirname(__file__), os.pardir, "images", "stats-table.png")
+
+
+class InlineThread:
+    def __init__(self, target, args=()):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+
+def queue_jobs(user, count):
+    for number in range(count):
+        image = Image(uuid=uuid.uuid4().hex, user=user, filename=f"{number}.png")
+        db.session.add(Job(kind=Job.EXTRACT, image=image, dedup_key=image.uuid))
+    db.session.commit()
+
+
+def skip_the_fair_order(monkeypatch):
+    # as if every worker had picked its candidates before any of them claimed
+    monkeypatch.setattr(
+        jobs,
+        "next_job_ids",
+        lambda claimable, stale_before: [
+            job_id for (job_id,) in db.session.query(Job.id).filter(claimable)
+        ],
+    )
+
+
+def test_claiming_keeps_to_the_per_user_cap(flask_app, user, monkeypatch):
+    monkeypatch.setitem(flask_app.config, "MAX_RUNNING_JOBS_PER_USER", 1)
+    monkeypatch.setitem(flask_app.config, "OCR_SLOTS", 4)
+    skip_the_fair_order(monkeypatch)
+    queue_jobs(user, 2)
+    bob = User(username="bob", email="bob@example.com")
+    queue_jobs(bob, 1)
+    claimed = [jobs.claim_job(jobs.worker_name(number)) for number in range(3)]
+    assert [job.image.user for job in claimed[:2]] == [user, bob]
+    assert claimed[2] is None
+
+
+def test_claiming_keeps_to_the_free_slots(flask_app, user, monkeypatch):
+    monkeypatch.setitem(flask_app.config, "OCR_SLOTS", 1)
+    monkeypatch.setitem(flask_app.config, "MAX_RUNNING_JOBS_PER_USER", 2)
+    skip_the_fair_order(monkeypatch)
+    queue_jobs(user, 1)
+    queue_jobs(User(username="bob", email="bob@example.com"), 1)
+    assert jobs.claim_job(jobs.worker_name(0)) is not None
+    assert jobs.claim_job(jobs.worker_name(1)) is None
+
+
+def test_claiming_waits_for_an_identical_running_job(flask_app, user, monkeypatch):
+    monkeypatch.setitem(flask_app.config, "OCR_SLOTS", 4)
+    monkeypatch.setitem(flask_app.config, "MAX_RUNNING_JOBS_PER_USER", 4)
+    skip_the_fair_order(monkeypatch)
+    queue_jobs(user, 2)
+    Job.query.update({Job.dedup_key: "abc:2:English"})
+    db.session.commit()
+    assert jobs.claim_job(jobs.worker_name(0)) is not None
+    assert jobs.claim_job(jobs.worker_name(1)) is None
+
+
+def test_a_retried_direct_upload_reuses_its_blob(flask_app, user, bucket, monkeypatch):
+    monkeypatch.setitem(flask_app.config, "JOB_RETRY_DELAY", 0)
+    monkeypatch.setattr(uploads, "Thread", InlineThread)
+    monkeypatch.setattr(uploads.thumbnail_executor, "submit", lambda *args: None)
+    attempts = []
+
+    def extract_table(image, number_of_columns, language):
+        attempts.append(image.blob_id)
+        if len(attempts) == 1:
+            raise IOError("S3 put failed")
+
+    monkeypatch.setattr(jobs, "extract_table", extract_table)
+    image = Image(
+        uuid=uuid.uuid4().hex,
+        user=user,
+        filename="scan.png",
+        status=Image.AWAITING_UPLOAD,
+    )
+    db.session.add(image)
+    db.session.commit()
+    with open(IMAGE, "rb") as f:
+        put_image_in_bucket(image.uuid, f.read(), "png", "scan")
+    jobs.process_direct_upload_in_background(image, 2, "English")
+    for number in range(2):
+        job = jobs.claim_job(jobs.worker_name(number))
+        jobs.run_job(job, jobs.worker_name(number))
+    assert Job.query.one().status == Job.DONE
+    assert len(attempts) == 2 and attempts[0] == attempts[1] is not None
+    assert image.blob.reference_count == 1
+
+
+@pytest.mark.parametrize("host", ["pod-" + "a" * 70, "web_1"])
+def test_free_slots_are_counted_per_host(flask_app, user, monkeypatch, host):
+    monkeypatch.setitem(flask_app.config, "OCR_SLOTS", 1)
+    monkeypatch.setitem(flask_app.config, "MAX_RUNNING_JOBS_PER_USER", 4)
+    skip_the_fair_order(monkeypatch)
+    queue_jobs(user, 3)
+    # a job running on another host, whose name LIKE "web_1" would match
+    monkeypatch.setattr(socket, "gethostname", lambda: "webx1")
+    assert jobs.claim_job(jobs.worker_name(0)) is not None
+    monkeypatch.setattr(socket, "gethostname", lambda: host)
+    assert jobs.claim_job(jobs.worker_name(0)) is not None
+    assert jobs.claim_job(jobs.worker_name(1)) is None
+
+
+def test_old_finished_jobs_are_pruned(flask_app, user):
+    queue_jobs(user, 4)
+    long_ago = datetime.utcnow() - timedelta(seconds=flask_app.config["JOB_RETENTION"])
+    statuses = [Job.DONE, Job.FAILED, Job.QUEUED, Job.DONE]
+    for job, status in zip(Job.query.order_by(Job.id), statuses):
+        job.status = status
+        job.available_at = long_ago if job.id < 4 else datetime.utcnow()
+    db.session.commit()
+    scheduler.prune_finished_jobs(datetime.utcnow())
+    assert [job.status for job in Job.query.order_by(Job.id)] == [Job.QUEUED, Job.DONE]
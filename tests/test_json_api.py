@@ -0,0 +1,62 @@
+import base64
+import io
+import json
+import os
+import requests
+import app.json_api as json_api
+import app.uploads as uploads
+
+IMAGE = os.path.join(os.path.dirname(__file__), os.pardir, "images", "stats-table.png")
+
+
+def create_upload(client, token):
+    response = client.post(
+        "/api/uploads",
+        json={"filename": "scan.png"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def test_direct_uploads_are_limited_by_the_post_policy(client, bucket, token):
+    upload = create_upload(client, token)
+    assert upload["method"] == "POST"
+    policy = json.loads(base64.b64decode(upload["fields"]["policy"]))
+    assert ["content-length-range", 1, json_api.MAX_UPLOAD_SIZE] in policy["conditions"]
+
+
+def test_completing_an_oversized_upload_is_refused(client, bucket, token, monkeypatch):
+    monkeypatch.setattr(json_api, "MAX_UPLOAD_SIZE", 10)
+    upload = create_upload(client, token)
+    requests.post(
+        upload["upload_url"], data=upload["fields"], files={"file": b"x" * 100}
+    )
+    response = client.post(
+        upload["complete_url"], headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 400
+    response = client.post(
+        upload["complete_url"], headers={"Authorization": f"Bearer {token}"}
+    )
+    assert "nothing has been uploaded" in response.get_json()["message"]
+
+
+def test_an_unreadable_file_is_rejected_on_its_own(client, bucket, token, monkeypatch):
+    monkeypatch.setattr(uploads.thumbnail_executor, "submit", lambda *args: None)
+    with open(IMAGE, "rb") as f:
+        contents = f.read()
+    response = client.post(
+        "/api/images",
+        data={
+            "images": [
+                (io.BytesIO(contents), "table.png"),
+                (io.BytesIO(b"not an image"), "broken.png"),
+            ]
+        },
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 202
+    data = response.get_json()
+    assert [job["filename"] for job in data["jobs"]] == ["table.png"]
+    assert [rejected["filename"] for rejected in data["rejected"]] == ["broken.png"]
@@ -0,0 +1,41 @@
+import cv2
+import numpy as np
+import api
+
+ROWS = 12
+ROW_HEIGHT = 40
+
+
+def ruled_table():
+    # dark text in a grid of rules running the full width and height
+    width, height = 600, ROWS * ROW_HEIGHT
+    image = np.full((height, width), 255, dtype=np.uint8)
+    for row in range(ROWS):
+        top = row * ROW_HEIGHT
+        cv2.line(image, (0, top), (width - 1, top), 0, 2)
+        text = f"Row {row} 12,5 700"
+        cv2.putText(image, text, (10, top + 28), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 0, 2)
+    for x in [0, 200, 400, width - 1]:
+        cv2.line(image, (x, 0), (x, height - 1), 0, 2)
+    return api.cvh.threshold_otsu(image)
+
+
+def test_rules_dont_join_the_rows_of_the_sample():
+    otsu = ruled_table()
+    sample = api.densest_text_rows(otsu, api.LANGUAGE_SAMPLE_ROWS)
+    assert sample.shape[0] <= otsu.shape[0] * api.LANGUAGE_SAMPLE_FRACTION
+    # three rows of text, each a band of its own between the padding
+    blank_rows = np.all(sample == 255, axis=1)
+    starts = np.flatnonzero(np.diff(blank_rows.astype(np.int8)) == -1)
+    assert len(starts) == api.LANGUAGE_SAMPLE_ROWS - 1
+
+
+def test_the_sample_is_capped_when_the_rows_run_together():
+    # speckles on every row, like a noisy photo, leave no gaps between rows
+    speckles = np.random.default_rng(0).random((400, 300)) < 0.01
+    otsu = np.where(speckles, 0, 255).astype(np.uint8)
+    sample = api.densest_text_rows(otsu, api.LANGUAGE_SAMPLE_ROWS)
+    assert sample.shape[0] <= max(
+        400 * api.LANGUAGE_SAMPLE_FRACTION,
+        api.LANGUAGE_SAMPLE_ROWS * api.MIN_CELL_HEIGHT,
+    )
@@ -0,0 +1,35 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+import api
+
+IMAGES = os.path.join(os.path.dirname(__file__), os.pardir, "images")
+
+
+def working_image(name):
+    return api.resize_for_ocr(cv2.imread(os.path.join(IMAGES, name)))
+
+
+def test_level_table_is_left_alone():
+    image = working_image("stats-table.png")
+    straightened, otsu = api.straighten_image(image)
+    assert straightened is image
+    assert otsu.shape == image.shape[:2]
+
+
+def test_skewed_table_is_straightened():
+    image = working_image("stats-table.png")
+    skewed = api.rotate(image, 2, border_mode=cv2.BORDER_REPLICATE)
+    ink = cv2.bitwise_not(
+        api.cvh.threshold_otsu(cv2.cvtColor(skewed, cv2.COLOR_BGR2GRAY))
+    )
+    assert api.estimate_skew(ink) == pytest.approx(-2, abs=0.3)
+    straightened, otsu = api.straighten_image(skewed)
+    assert api.find_number_of_columns_in_image(straightened, otsu=otsu) == 4
+
+
+def test_blank_image_is_rejected():
+    with pytest.raises(api.ImageQualityError):
+        api.straighten_image(np.full((200, 300, 3), 255, dtype=np.uint8))
@@ -0,0 +1,63 @@
+import uuid
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+from app import db
+from app.models import Blob, Image
+
+
+@contextmanager
+def counted_queries():
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+
+
+def add_images(user, count):
+    for number in range(count):
+        blob = Blob(
+            content_hash=uuid.uuid4().hex * 2,
+            file_ending="png",
+            thumbnails_ready=True,
+            width=600,
+            height=400,
+        )
+        image = Image(uuid=uuid.uuid4().hex, user=user, filename=f"{number}.png")
+        image.blob = blob
+        db.session.add(image)
+    db.session.commit()
+
+
+def queries_for(client, url, headers=None):
+    with counted_queries() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return len(statements)
+
+
+@pytest.mark.parametrize("url, queries", [("/index", 2), ("/images/", 3)])
+def test_pages_run_a_fixed_number_of_queries(client, user, url, queries):
+    # the user, then whether they have images, or the count and the page
+    add_images(user, 1)
+    assert queries_for(client, url) == queries
+    add_images(user, 30)
+    assert queries_for(client, url) == queries
+
+
+def test_the_json_listing_is_paginated(flask_app, client, user, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    add_images(user, 1)
+    assert queries_for(client, "/api/images", headers) == 3
+    add_images(user, flask_app.config["IMAGES_PER_PAGE"])
+    assert queries_for(client, "/api/images", headers) == 3
+    listing = client.get("/api/images", headers=headers).get_json()
+    assert len(listing["images"]) == flask_app.config["IMAGES_PER_PAGE"]
+    listing = client.get(listing["next_url"], headers=headers).get_json()
+    assert len(listing["images"]) == 1 and listing["next_url"] is None
@@ -0,0 +1,65 @@
+from threading import Barrier
+
+import numpy as np
+import api
+
+ROW_HEIGHT = 40
+
+
+def table():
+    rows = [["Fruit", "0 years"], ["Apples", "12"], ["Pears", "31"], ["Plums", "56"]]
+    confidences = [[90, 90], [90, 60], [90, 40], [90, 95]]
+    boxes = [
+        [
+            (10, i * ROW_HEIGHT, 60, i * ROW_HEIGHT + 20),
+            (200, i * ROW_HEIGHT, 260, i * ROW_HEIGHT + 20),
+        ]
+        for i in range(len(rows))
+    ]
+    return api.Table(rows, 2, confidences, boxes)
+
+
+def strip_reading(strip, language_config):
+    # the digits-only read of the whole column, header included
+    strip_top = ROW_HEIGHT - api.CELL_PADDING
+    readings = [("0", 99), ("12", 80), ("34", 80), ("58", 50)]
+    return [
+        api.Box(
+            api.WORD_LEVEL,
+            5,
+            top - strip_top,
+            50,
+            20,
+            55,
+            top - strip_top + 20,
+            1000,
+            conf,
+            text,
+        )
+        for (text, conf), top in zip(readings, range(0, 160, ROW_HEIGHT))
+    ]
+
+
+def test_only_numbers_read_with_more_confidence_are_replaced(monkeypatch):
+    monkeypatch.setattr(api, "ocr_numeric_strip", strip_reading)
+    otsu = np.full((200, 300), 255, dtype=np.uint8)
+    result = api.reocr_numeric_columns(table(), otsu, "eng")
+    assert [row[1] for row in result.rows] == ["0 years", "12", "34", "56"]
+    assert [row[0] for row in result.rows] == ["Fruit", "Apples", "Pears", "Plums"]
+    assert [row[1] for row in result.confidences] == [90, 80, 80, 95]
+
+
+def test_low_confidence_cells_are_read_in_parallel(flask_app, monkeypatch):
+    # even with a page per core, a page reads its cells more than one at a time
+    workers = flask_app.config["OCR_WORKERS_PER_JOB"]
+    assert workers >= 2
+    barrier = Barrier(2, timeout=5)
+
+    def ocr_cell(crop, tesseract_config):
+        barrier.wait()  # raises unless another cell is read at the same time
+        return "99", 99
+
+    monkeypatch.setattr(api, "ocr_cell", ocr_cell)
+    otsu = np.full((200, 300), 255, dtype=np.uint8)
+    result = api.reocr_low_confidence_cells(table(), otsu, "eng", 70, workers)
+    assert [row[1] for row in result.rows] == ["0 years", "99", "99", "56"]
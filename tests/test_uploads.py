@@ -0,0 +1,148 @@
+import json
+from datetime import datetime, timedelta
+from PIL import Image as PILImage
+import app.uploads as uploads
+from app import db
+from app.models import Blob, Image
+from api import table_rows_to_json
+from aws_helpers import content_hash
+
+CONTENT_HASH = "ab" * 32
+
+
+class InlineThread:
+    # runs the target when started, so the test sees what it did
+    def __init__(self, target, args=()):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+
+def add_example(flask_app, monkeypatch, tmp_path):
+    precomputed = {
+        "content_hash": CONTENT_HASH,
+        "file_ending": "png",
+        "thumbnails_ready": True,
+        "num_columns": 1,
+        "language": "English",
+        "tabular": table_rows_to_json([["1"]]),
+    }
+    (tmp_path / "precomputed.json").write_text(json.dumps({"x.png": precomputed}))
+    monkeypatch.setitem(flask_app.config, "EXAMPLES_DIRECTORY", str(tmp_path))
+    uploads.example_content_hashes.cache_clear()
+    monkeypatch.setattr(uploads, "store_table_files", lambda *args: None)
+    return precomputed
+
+
+def test_deleting_the_last_example_image_keeps_its_files(
+    flask_app, user, monkeypatch, tmp_path
+):
+    precomputed = add_example(flask_app, monkeypatch, tmp_path)
+    deleted_prefixes = []
+    monkeypatch.setattr(uploads, "delete_files", deleted_prefixes.append)
+    monkeypatch.setattr(uploads, "Thread", InlineThread)
+    unique_id = uploads.add_precomputed_image(precomputed, "x.png", user)
+    uploads.delete_image_and_files(Image.query.filter_by(uuid=unique_id).one())
+    assert Blob.query.count() == 0
+    assert deleted_prefixes == [unique_id]
+    uploads.example_content_hashes.cache_clear()
+
+
+def test_deleting_the_last_upload_of_a_blob_deletes_its_files(
+    flask_app, user, monkeypatch
+):
+    deleted_prefixes = []
+    monkeypatch.setattr(uploads, "delete_files", deleted_prefixes.append)
+    monkeypatch.setattr(uploads, "Thread", InlineThread)
+    blob = Blob(content_hash="cd" * 32, file_ending="png", reference_count=1)
+    image = Image(uuid="0" * 32, user=user, filename="a.png", blob=blob)
+    db.session.add(image)
+    db.session.commit()
+    uploads.delete_image_and_files(image)
+    assert deleted_prefixes == ["0" * 32, f"blobs/{'cd' * 32}/"]
+
+
+def test_a_blob_row_stays_until_its_files_are_deleted(flask_app, user, monkeypatch):
+    deleting_rows = []
+    monkeypatch.setattr(
+        uploads,
+        "delete_files",
+        lambda prefix: deleting_rows.append(
+            Blob.query.filter(Blob.deleting_since.isnot(None)).count()
+        ),
+    )
+    monkeypatch.setattr(uploads, "Thread", InlineThread)
+    blob = Blob(content_hash="cd" * 32, file_ending="png", reference_count=1)
+    db.session.add(Image(uuid="0" * 32, user=user, filename="a.png", blob=blob))
+    db.session.commit()
+    uploads.delete_image_and_files(Image.query.one())
+    assert deleting_rows == [1, 1]
+    assert Blob.query.count() == 0
+
+
+def add_deleting_blob(image_contents, deleting_since):
+    blob = Blob(
+        content_hash=content_hash(image_contents),
+        file_ending="png",
+        reference_count=0,
+        deleting_since=deleting_since,
+    )
+    db.session.add(blob)
+    db.session.commit()
+    return blob.id
+
+
+def record_stores(monkeypatch, events):
+    def store_blob(image_contents, hash_of_contents):
+        events.append("stored")
+        blob = Blob(content_hash=hash_of_contents, file_ending="png")
+        return uploads.add_blob(blob)
+
+    monkeypatch.setattr(uploads, "store_blob", store_blob)
+
+
+def test_a_blob_is_stored_again_once_its_files_are_deleted(flask_app, monkeypatch):
+    blob_id = add_deleting_blob(b"scan", datetime.utcnow())
+    events = []
+
+    def sleep(seconds):  # the delete finishes while the upload waits
+        events.append("waited")
+        uploads.remove_blob(blob_id)
+
+    monkeypatch.setattr(uploads.time, "sleep", sleep)
+    record_stores(monkeypatch, events)
+    uploads.acquire_blob(b"scan")
+    assert events == ["waited", "stored"]
+    stored = Blob.query.one()
+    assert stored.deleting_since is None and stored.reference_count == 1
+
+
+def test_a_delete_that_never_finished_is_taken_over(flask_app, monkeypatch):
+    timeout = timedelta(seconds=flask_app.config["BLOB_DELETE_TIMEOUT"])
+    add_deleting_blob(b"scan", datetime.utcnow() - 2 * timeout)
+    events = []
+    record_stores(monkeypatch, events)
+    uploads.acquire_blob(b"scan")
+    assert events == ["stored"]
+    assert db.session.query(Blob.deleting_since).scalar() is None
+
+
+def test_thumbnails_larger_than_the_image_are_skipped(flask_app, monkeypatch):
+    puts = []
+    monkeypatch.setattr(uploads, "gather", lambda *calls: puts.extend(calls))
+    uploads.put_blob_thumbnails(CONTENT_HASH, PILImage.new("RGB", (600, 352)))
+    assert {(put[4], put[3]) for put in puts} == {
+        ("image_thumbnail_400", "webp"),
+        ("image_thumbnail_400", "jpg"),
+    }
+    blob = Blob(content_hash=CONTENT_HASH, thumbnails_ready=True, width=600, height=352)
+    assert "image_thumbnail_800" not in blob.thumbnail_srcset("jpg")
+    assert blob.detail_url() is None
+
+
+def test_older_blobs_advertise_every_thumbnail(flask_app):
+    blob = Blob(content_hash=CONTENT_HASH, thumbnails_ready=True)
+    assert "image_thumbnail_800" in blob.thumbnail_srcset("webp")
+    assert blob.detail_url() is not None
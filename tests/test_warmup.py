@@ -0,0 +1,20 @@
+from types import SimpleNamespace
+import pytesseract
+import api
+
+
+def test_a_missing_language_does_not_stop_the_warmup(monkeypatch):
+    tried = []
+
+    def analyze(image_json, number_of_columns):
+        tried.append(image_json["language"])
+        if image_json["language"] == "Norwegian":
+            raise pytesseract.TesseractError(1, "Failed loading language 'nor'")
+        return SimpleNamespace(rows=[["12", "345"]])
+
+    monkeypatch.setattr(api, "analyze", analyze)
+    import warmup
+
+    tried.clear()
+    warmup.warm_ocr()
+    assert tried == list(api.LANGUAGE_MAP)
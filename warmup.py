@@ -0,0 +1,85 @@
+"""uWSGI entry point that warms the app up in the master before it forks.
+
+Everything loaded here is shared copy-on-write between the workers, so a new
+worker costs less memory and its first request doesn't pay for the imports,
+template compilation and the first run through the OCR pipeline. After the
+fork every worker starts its JOB_WORKER_THREADS job threads.
+"""
+
+import base64
+import gc
+import time
+
+import cv2
+import numpy as np
+import pytesseract
+from sqlalchemy.orm import configure_mappers
+
+import api
+from app.jobs import start_local_workers
+from wsgi import app
+
+try:
+    from uwsgidecorators import postfork
+except ImportError:  # imported outside uWSGI, e.g. to measure the warmup
+    postfork = None
+
+WARMUP_TEXT = ["12 345", "6,7 89"]
+
+
+def warmup_image():
+    image = np.full((40 * len(WARMUP_TEXT) + 20, 200), 255, dtype=np.uint8)
+    for i, line in enumerate(WARMUP_TEXT):
+        cv2.putText(image, line, (10, 40 * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX, 1, 0, 2)
+    _, png = cv2.imencode(".png", image)
+    return png.tobytes()
+
+
+def warm_ocr():
+    # reads the language data once so the page cache has it for every worker
+    preprocessed = api.preprocess_image(warmup_image())
+    api.find_number_of_columns_in_image(
+        preprocessed["image"], otsu=preprocessed["otsu"]
+    )
+    for language in api.LANGUAGE_MAP:
+        image_json = {
+            "base64_image": base64.b64encode(preprocessed["image_contents"]),
+            "language": language,
+        }
+        try:
+            table = api.analyze(image_json=image_json, number_of_columns=1)
+        except pytesseract.TesseractNotFoundError:
+            app.logger.warning("Tesseract not found, skipping OCR warmup")
+            return
+        except pytesseract.TesseractError as e:  # e.g. no traineddata for it
+            app.logger.warning(f"Skipping OCR warmup in {language}: {e}")
+            continue
+        api.table_rows_to_excel(table.rows)
+
+
+def warm_templates():
+    for template in app.jinja_env.list_templates():
+        app.jinja_env.get_template(template)
+
+
+def warmup():
+    start = time.perf_counter()
+    configure_mappers()
+    warm_templates()
+    warm_ocr()
+    # keep the collector from touching (and so copying) the preloaded objects
+    gc.collect()
+    gc.freeze()
+    app.logger.info(f"Warmup took {time.perf_counter() - start:.2f} seconds")
+
+
+def start_job_workers():
+    # the threads would die in the fork, so each worker starts its own, and
+    # queued jobs don't wait for the worker's first enqueue to be picked up
+    if app.config["JOB_WORKER_THREADS"] > 0:
+        start_local_workers()
+
+
+warmup()
+if postfork is not None:
+    postfork(start_job_workers)
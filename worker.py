@@ -0,0 +1,35 @@
+import argparse
+import signal
+import sys
+from threading import Event, Thread
+from app import app
+from app.jobs import work, worker_name
+
+parser = argparse.ArgumentParser(
+    description="Run extraction jobs from the shared job queue.",
+    prog=sys.argv[0],
+)
+parser.add_argument(
+    "--threads", type=int, default=1, help="number of jobs to run at the same time"
+)
+
+
+def main():
+    args = parser.parse_args()
+    stop = Event()
+    # finish the jobs we have, then exit
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+    threads = [
+        Thread(target=work, args=(worker_name(number), stop))
+        for number in range(args.threads)
+    ]
+    for thread in threads:
+        thread.start()
+    app.logger.info(f"Started {args.threads} extraction workers")
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
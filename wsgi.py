@@ -1,10 +1,10 @@
 from app import app, db
-from app.models import User, Image
+from app.models import User, Image, Blob, Job
 
 
 @app.shell_context_processor
 def make_shell_context():
-    return {"db": db, "User": User, "Image": Image}
+    return {"db": db, "User": User, "Image": Image, "Blob": Blob, "Job": Job}
 
 
 if __name__ == "__main__":